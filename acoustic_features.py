@@ -0,0 +1,168 @@
+import numpy as np
+
+
+# Energy envelope resolution used to find syllable nuclei
+ENVELOPE_FRAME_SECONDS = 0.01
+# A syllable nucleus must rise at least this far above the dip before it
+SYLLABLE_PROMINENCE_DB = 2.0
+# Pitch search range covering adult and child voices
+MIN_PITCH_HZ = 75
+MAX_PITCH_HZ = 400
+# Pitch is estimated on windows of this length, one per VAD frame
+PITCH_WINDOW_SECONDS = 0.04
+# Audio is decimated to about this rate for pitch tracking, which only needs the low band
+PITCH_SAMPLE_RATE = 8000
+# Normalized autocorrelation peak needed to call a frame voiced
+VOICING_THRESHOLD = 0.45
+# Number of points kept in the pitch and energy contours
+CONTOUR_POINTS = 200
+# Pause length histogram bucket edges, in seconds
+PAUSE_BUCKETS = [0.25, 0.5, 1.0, 2.0]
+
+# Pitch frames are processed in blocks to bound memory on long recordings
+_PITCH_BLOCK_FRAMES = 2048
+
+
+# Start and end indices of each run of True values in a boolean array
+def find_runs(mask):
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+# Average a contour into at most `points` bins, ignoring NaNs (unvoiced frames)
+def _downsample_contour(values, points):
+    if len(values) == 0:
+        return []
+    bins = np.array_split(values, min(points, len(values)))
+    contour = []
+    for values_in_bin in bins:
+        finite = values_in_bin[np.isfinite(values_in_bin)]
+        contour.append(round(float(finite.mean()), 1) if len(finite) else None)
+    return contour
+
+
+# Fundamental frequency per frame from the FFT autocorrelation; NaN where unvoiced or silent
+def _pitch_track(samples, sample_rate, frame_length, speech):
+    # Averaging neighbouring samples is a cheap enough low-pass for autocorrelation pitch
+    factor = max(sample_rate // PITCH_SAMPLE_RATE, 1)
+    if factor > 1:
+        usable = len(samples) // factor * factor
+        samples = samples[:usable].reshape(-1, factor) @ np.full(factor, 1 / factor, np.float32)
+        sample_rate /= factor
+
+    window_length = int(PITCH_WINDOW_SECONDS * sample_rate)
+    fft_size = 1 << int(np.ceil(np.log2(2 * window_length)))
+    min_lag = int(sample_rate / MAX_PITCH_HZ)
+    max_lag = min(int(sample_rate / MIN_PITCH_HZ), window_length - 1)
+    window = np.hanning(window_length).astype(np.float32)
+
+    pitch = np.full(len(speech), np.nan, np.float32)
+    speech_frames = np.flatnonzero(speech)
+    # Frames whose analysis window would run past the end are skipped
+    frame_starts = speech_frames * frame_length // factor
+    keep = frame_starts + window_length <= len(samples)
+    speech_frames, frame_starts = speech_frames[keep], frame_starts[keep]
+    offsets = np.arange(window_length)
+    for block_start in range(0, len(speech_frames), _PITCH_BLOCK_FRAMES):
+        frames = speech_frames[block_start:block_start + _PITCH_BLOCK_FRAMES]
+        starts = frame_starts[block_start:block_start + _PITCH_BLOCK_FRAMES]
+        windows = samples[starts[:, None] + offsets] * window
+        spectrum = np.fft.rfft(windows, fft_size, axis=1)
+        autocorrelation = np.fft.irfft(spectrum.real ** 2 + spectrum.imag ** 2, fft_size, axis=1)
+        energy = autocorrelation[:, :1] + 1e-10
+        candidates = autocorrelation[:, min_lag:max_lag] / energy
+        best = candidates.argmax(axis=1)
+        voiced = candidates[np.arange(len(frames)), best] > VOICING_THRESHOLD
+        pitch[frames[voiced]] = sample_rate / (best[voiced] + min_lag)
+    return pitch
+
+
+# Syllable nuclei: peaks of the smoothed energy envelope inside speech that rise at least
+# SYLLABLE_PROMINENCE_DB above the preceding dip (after de Jong & Wempe, 2009)
+def _syllable_nuclei(samples, sample_rate, speech, vad_frame_seconds):
+    frame_length = max(int(ENVELOPE_FRAME_SECONDS * sample_rate), 1)
+    frame_count = len(samples) // frame_length
+    if frame_count < 3:
+        return np.zeros(0, np.int64), np.zeros(0, np.float32), np.zeros(0, bool)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+    envelope = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame_length + 1e-10)
+    # 50 ms moving average smooths out pitch-period ripple
+    envelope = np.convolve(envelope, np.ones(5, np.float32) / 5, mode="same")
+
+    # Map VAD frames onto the finer envelope grid
+    ratio = vad_frame_seconds / ENVELOPE_FRAME_SECONDS
+    in_speech = speech[np.minimum((np.arange(frame_count) / ratio).astype(np.int64), len(speech) - 1)]
+    if not in_speech.any():
+        return np.zeros(0, np.int64), envelope, in_speech
+
+    # Peaks must also clear the median speech energy, so quiet ripples between words don't count
+    floor = np.median(envelope[in_speech]) - 6
+    is_peak = np.zeros(frame_count, bool)
+    is_peak[1:-1] = (envelope[1:-1] > envelope[:-2]) & (envelope[1:-1] >= envelope[2:])
+    peaks = np.flatnonzero(is_peak & in_speech & (envelope > floor))
+    if len(peaks) == 0:
+        return peaks, envelope, in_speech
+
+    # Lowest point between each peak and the one before it
+    boundaries = np.concatenate(([0], peaks))
+    dips = np.minimum.reduceat(envelope, boundaries)[:-1]
+    dips[0] = envelope[:peaks[0] + 1].min()
+    return peaks[envelope[peaks] - dips >= SYLLABLE_PROMINENCE_DB], envelope, in_speech
+
+
+# Objective fluency and prosody measures from mono samples and a per-frame speech mask
+# (detect_speech output). Runs on the whole untrimmed recording, so timing is preserved.
+def extract_features(samples, sample_rate, speech, vad_frame_seconds):
+    duration = len(samples) / sample_rate
+    starts, ends = find_runs(speech)
+    speaking_seconds = float((ends - starts).sum() * vad_frame_seconds)
+    if duration == 0 or len(starts) == 0:
+        return None
+
+    nuclei, envelope, envelope_in_speech = _syllable_nuclei(samples, sample_rate, speech, vad_frame_seconds)
+    # Count syllables per run of speech between pauses
+    nucleus_times = nuclei * ENVELOPE_FRAME_SECONDS
+    run_ends = ends * vad_frame_seconds
+    syllables_per_run = np.bincount(np.searchsorted(run_ends, nucleus_times), minlength=len(starts))[:len(starts)]
+
+    pauses = (starts[1:] - ends[:-1]) * vad_frame_seconds
+    pause_histogram = np.histogram(pauses, bins=PAUSE_BUCKETS + [np.inf])[0]
+
+    frame_length = max(int(vad_frame_seconds * sample_rate), 1)
+    pitch = _pitch_track(samples, sample_rate, frame_length, speech)
+    voiced_pitch = pitch[np.isfinite(pitch)]
+    if len(voiced_pitch):
+        # Semitone spread is comparable across low and high voices
+        semitones = 12 * np.log2(voiced_pitch / np.median(voiced_pitch))
+        pitch_stats = {
+            "pitch_median_hz": round(float(np.median(voiced_pitch)), 1),
+            "pitch_range_semitones": round(float(np.percentile(semitones, 90) - np.percentile(semitones, 10)), 1),
+            "pitch_variation_semitones": round(float(semitones.std()), 2),
+        }
+    else:
+        pitch_stats = {"pitch_median_hz": None, "pitch_range_semitones": None, "pitch_variation_semitones": None}
+
+    syllable_count = int(len(nuclei))
+    features = {
+        "duration_seconds": round(duration, 2),
+        "speaking_seconds": round(speaking_seconds, 2),
+        "phonation_ratio": round(speaking_seconds / duration, 3),
+        "syllable_count": syllable_count,
+        # Syllables per minute over the whole recording and over speaking time only
+        "speech_rate": round(syllable_count / duration * 60, 1),
+        "articulation_rate": round(syllable_count / speaking_seconds * 60, 1) if speaking_seconds else 0.0,
+        "mean_length_of_run": round(float(syllables_per_run.mean()), 2),
+        "pause_count": int(len(pauses)),
+        "pauses_per_minute": round(len(pauses) / duration * 60, 2),
+        "pause_median_seconds": round(float(np.median(pauses)), 2) if len(pauses) else 0.0,
+        "pause_p90_seconds": round(float(np.percentile(pauses, 90)), 2) if len(pauses) else 0.0,
+        "pause_histogram": {
+            f"{low:g}-{high:g}s" if np.isfinite(high) else f"{low:g}s+": int(count)
+            for low, high, count in zip(PAUSE_BUCKETS, PAUSE_BUCKETS[1:] + [np.inf], pause_histogram)
+        },
+        **pitch_stats,
+        "energy_variation_db": round(float(envelope[envelope_in_speech].std()), 2) if envelope_in_speech.any() else 0.0,
+        "pitch_contour": _downsample_contour(pitch, CONTOUR_POINTS),
+        "energy_contour": _downsample_contour(envelope, CONTOUR_POINTS),
+    }
+    return features
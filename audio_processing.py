@@ -0,0 +1,400 @@
+import io
+import os
+import struct
+import threading
+import wave
+from collections import namedtuple
+from contextlib import contextmanager
+
+import numpy as np
+
+from acoustic_features import extract_features, find_runs
+
+
+# Largest upload a single request may hold in memory (a 10-minute 44.1 kHz stereo WAV is about 106 MB)
+MAX_AUDIO_MB = float(os.environ.get("MAX_AUDIO_MB", "120"))
+# Total audio that all in-flight requests in this process may hold at once
+AUDIO_MEMORY_BUDGET_MB = float(os.environ.get("AUDIO_MEMORY_BUDGET_MB", "512"))
+# Decoding to PCM needs room for the upload plus its float32 samples
+DECODE_MEMORY_FACTOR = 3
+# Gemini rejects requests with more than about 20 MB of inline data
+INLINE_AUDIO_LIMIT_MB = 20
+
+# Sample rate uploads are resampled to before sending; plenty for speech
+TARGET_SAMPLE_RATE = int(os.environ.get("AUDIO_SAMPLE_RATE", "16000"))
+
+# Trim leading/trailing silence and shorten long pauses before sending
+TRIM_SILENCE = os.environ.get("TRIM_SILENCE", "1") == "1"
+# Internal pauses longer than this are shortened to this length, in seconds
+MAX_PAUSE_SECONDS = float(os.environ.get("MAX_PAUSE_SECONDS", "0.6"))
+# Silences shorter than this are part of normal speech, not pauses (a common fluency-research cutoff)
+MIN_PAUSE_SECONDS = 0.25
+# Pauses at least this long are reported separately as long pauses
+LONG_PAUSE_SECONDS = 1.0
+# Silence kept before the first and after the last word
+EDGE_MARGIN_SECONDS = 0.15
+# Voice activity is decided per frame of this length
+VAD_FRAME_SECONDS = 0.02
+# Frames quieter than this (dBFS) are never speech, so pure background noise isn't mistaken for it
+VAD_MIN_SPEECH_DB = -50
+# How long a request waits for memory held by other requests before giving up
+AUDIO_BUDGET_TIMEOUT_SECONDS = 60
+
+DEMO_AUDIO_DATA = b'dummy audio data'
+
+
+class AudioTooLargeError(ValueError):
+    pass
+
+
+# Audio ready to send: the encoded bytes, their MIME type, pause statistics, the mono samples
+# that were encoded and acoustic features of the original recording. All but the first two are
+# None when the format could not be decoded (pause_stats also when trimming is off).
+PreparedAudio = namedtuple(
+    "PreparedAudio", ["data", "mime_type", "pause_stats", "samples", "sample_rate", "features"]
+)
+
+
+# Process-wide byte budget, so a burst of large uploads queues instead of exhausting memory
+class MemoryBudget:
+    def __init__(self, limit_bytes):
+        self.limit_bytes = limit_bytes
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes, timeout=AUDIO_BUDGET_TIMEOUT_SECONDS):
+        # A single request larger than the whole budget still runs, but only on its own
+        nbytes = min(nbytes, self.limit_bytes)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_use + nbytes <= self.limit_bytes, timeout):
+                raise TimeoutError("The server is busy processing other recordings. Please try again in a moment.")
+            self.in_use += nbytes
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.in_use -= nbytes
+                self._condition.notify_all()
+
+
+_audio_budget = MemoryBudget(int(AUDIO_MEMORY_BUDGET_MB * 1024 * 1024))
+
+
+# Size of the recording in bytes, from the stream's end offset so nothing is read or copied
+def audio_size(audio_file):
+    if isinstance(audio_file, str):  # Simulated audio for demo
+        return len(DEMO_AUDIO_DATA)
+    if isinstance(audio_file, os.PathLike):
+        return os.path.getsize(audio_file)
+    position = audio_file.tell()
+    size = audio_file.seek(0, os.SEEK_END)
+    audio_file.seek(position)
+    return size
+
+
+# Read the audio to send inline with a request.
+# In-memory uploads (Streamlit's UploadedFile is a BytesIO) hand back their buffer without copying it.
+def read_audio_data(audio_file):
+    if isinstance(audio_file, str):  # Simulated audio for demo
+        return DEMO_AUDIO_DATA
+    if isinstance(audio_file, os.PathLike):
+        with open(audio_file, "rb") as f:
+            return f.read()
+    if hasattr(audio_file, "getvalue"):
+        return audio_file.getvalue()
+    audio_file.seek(0)
+    return audio_file.read()
+
+
+# Identify the container from its magic bytes; unknown data is treated as WAV like before
+def detect_mime_type(data):
+    header = bytes(data[:12])
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "audio/wav"
+    if header[:4] == b"FORM" and header[8:12] in (b"AIFF", b"AIFC"):
+        return "audio/aiff"
+    if header[:4] == b"fLaC":
+        return "audio/flac"
+    if header[:4] == b"OggS":
+        return "audio/ogg"
+    if header[:4] == b"\x1a\x45\xdf\xa3":
+        return "audio/webm"
+    if header[4:8] == b"ftyp":
+        return "audio/mp4"
+    if header[:3] == b"ID3":
+        return "audio/mp3"
+    if len(header) >= 2 and header[0] == 0xFF:
+        # ADTS AAC frames have layer bits 00, MPEG audio frames don't
+        if header[1] & 0xF6 == 0xF0:
+            return "audio/aac"
+        if header[1] & 0xE0 == 0xE0:
+            return "audio/mp3"
+    return "audio/wav"
+
+
+# Decode a PCM or IEEE float WAV into float32 samples shaped (frames, channels)
+def decode_wav(data):
+    view = memoryview(data)
+    if bytes(view[:4]) != b"RIFF" or bytes(view[8:12]) != b"WAVE":
+        raise ValueError("Not a WAV file")
+
+    fmt = None
+    pcm = None
+    position = 12
+    while position + 8 <= len(view):
+        chunk_id = bytes(view[position:position + 4])
+        chunk_size = int.from_bytes(view[position + 4:position + 8], "little")
+        body = view[position + 8:position + 8 + chunk_size]
+        if chunk_id == b"fmt " and len(body) >= 16:
+            fmt = struct.unpack("<HHIIHH", body[:16])
+            # WAVE_FORMAT_EXTENSIBLE keeps the real format code at the start of the subformat GUID
+            if fmt[0] == 0xFFFE and len(body) >= 26:
+                fmt = (struct.unpack("<H", body[24:26])[0],) + fmt[1:]
+        elif chunk_id == b"data":
+            pcm = body
+        position += 8 + chunk_size + (chunk_size & 1)
+
+    if fmt is None or pcm is None:
+        raise ValueError("WAV file is missing its fmt or data chunk")
+    audio_format, channels, sample_rate, _, block_align, bits = fmt
+    if channels < 1 or block_align < 1:
+        raise ValueError("Invalid WAV header")
+    pcm = pcm[:len(pcm) // block_align * block_align]
+
+    if audio_format == 1 and bits == 8:
+        samples = (np.frombuffer(pcm, np.uint8).astype(np.float32) - 128) / 128
+    elif audio_format == 1 and bits == 16:
+        samples = np.frombuffer(pcm, "<i2").astype(np.float32) / 32768
+    elif audio_format == 1 and bits == 24:
+        raw = np.frombuffer(pcm, np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+        # Sign-extend from 24 bits
+        ints = (ints << 8) >> 8
+        samples = ints.astype(np.float32) / 8388608
+    elif audio_format == 1 and bits == 32:
+        samples = np.frombuffer(pcm, "<i4").astype(np.float32) / 2147483648
+    elif audio_format == 3 and bits in (32, 64):
+        samples = np.frombuffer(pcm, "<f4" if bits == 32 else "<f8").astype(np.float32)
+    else:
+        raise ValueError(f"Unsupported WAV encoding (format {audio_format}, {bits} bits)")
+
+    return samples.reshape(-1, channels), sample_rate
+
+
+def to_mono(samples):
+    if samples.ndim == 1:
+        return samples
+    if samples.shape[1] == 1:
+        return samples[:, 0]
+    # A matrix product is much faster than mean() over the short channel axis
+    return samples @ np.full(samples.shape[1], 1 / samples.shape[1], np.float32)
+
+
+# Windowed-sinc low-pass filter applied block by block with FFT overlap-add.
+# cutoff is a fraction of the sample rate (at most 0.5).
+def _lowpass(samples, cutoff, taps=101):
+    offsets = np.arange(taps) - (taps - 1) / 2
+    kernel = 2 * cutoff * np.sinc(2 * cutoff * offsets) * np.hamming(taps)
+    kernel = (kernel / kernel.sum()).astype(np.float32)
+
+    # Small single-precision FFTs stay in cache and are the fastest option here
+    fft_size = 1 << 12
+    block = fft_size - taps + 1
+    kernel_fft = np.fft.rfft(kernel, fft_size).astype(np.complex64)
+    filtered = np.zeros(len(samples) + taps - 1, np.float32)
+    for start in range(0, len(samples), block):
+        segment = samples[start:start + block]
+        result = np.fft.irfft(np.fft.rfft(segment, fft_size) * kernel_fft, fft_size)
+        filtered[start:start + len(segment) + taps - 1] += result[:len(segment) + taps - 1]
+
+    delay = (taps - 1) // 2
+    return filtered[delay:delay + len(samples)]
+
+
+# Resample mono audio with linear interpolation, low-pass filtering first when downsampling
+def resample(samples, sample_rate, target_rate):
+    if sample_rate == target_rate or len(samples) < 2:
+        return samples
+    if target_rate < sample_rate:
+        # Keep a little headroom below the new Nyquist frequency
+        samples = _lowpass(samples, 0.45 * target_rate / sample_rate)
+
+    output_length = int(len(samples) * target_rate / sample_rate)
+    step = sample_rate / target_rate
+    resampled = np.empty(output_length, np.float32)
+    # Interpolate in blocks so the float64 position arrays stay small for long recordings
+    block = 1 << 20
+    for start in range(0, output_length, block):
+        positions = np.arange(start, min(start + block, output_length)) * step
+        index = np.minimum(positions.astype(np.int64), len(samples) - 2)
+        fraction = (positions - index).astype(np.float32)
+        resampled[start:start + len(positions)] = samples[index] * (1 - fraction) + samples[index + 1] * fraction
+    return resampled
+
+
+# Encode mono float samples as a 16-bit PCM WAV
+def encode_wav(samples, sample_rate):
+    pcm = (np.clip(samples, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+# Energy and zero-crossing voice activity detection. Returns one boolean per VAD frame.
+def detect_speech(samples, sample_rate):
+    frame_length = max(int(sample_rate * VAD_FRAME_SECONDS), 1)
+    frame_count = len(samples) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, bool)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, frame_length)
+
+    energy_db = 10 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame_length + 1e-10)
+    signs = np.signbit(frames)
+    zero_crossing_rate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+
+    # Thresholds adapt to the recording: the quietest frames estimate the noise floor.
+    # The cap below the peak keeps recordings without any silence from being marked silent.
+    noise_floor = np.percentile(energy_db, 10)
+    peak = np.percentile(energy_db, 99)
+    threshold = max(min(noise_floor + 10, peak - 20), VAD_MIN_SPEECH_DB)
+    voiced = energy_db > threshold
+    # Quiet but noisy frames are unvoiced consonants such as "s" and "f"
+    unvoiced_threshold = max(min(noise_floor + 5, peak - 25), VAD_MIN_SPEECH_DB)
+    unvoiced = (energy_db > unvoiced_threshold) & (zero_crossing_rate > 0.25)
+    speech = voiced | unvoiced
+
+    # Gaps shorter than a pause belong to the surrounding speech
+    starts, ends = find_runs(~speech)
+    min_gap = int(MIN_PAUSE_SECONDS / VAD_FRAME_SECONDS)
+    for start, end in zip(starts, ends):
+        if end - start < min_gap and start > 0 and end < frame_count:
+            speech[start:end] = True
+    # Isolated bursts shorter than 100 ms are clicks and pops, not words
+    starts, ends = find_runs(speech)
+    for start, end in zip(starts, ends):
+        if end - start < int(0.1 / VAD_FRAME_SECONDS):
+            speech[start:end] = False
+    return speech
+
+
+# Cut leading/trailing silence and shorten internal pauses to MAX_PAUSE_SECONDS.
+# Returns the trimmed samples and statistics about the pauses in the original recording.
+def trim_silence(samples, sample_rate, speech=None):
+    if speech is None:
+        speech = detect_speech(samples, sample_rate)
+    frame_length = max(int(sample_rate * VAD_FRAME_SECONDS), 1)
+    recorded_seconds = len(samples) / sample_rate
+    starts, ends = find_runs(speech)
+    if len(starts) == 0:
+        # Nothing that sounds like speech; send the recording untouched rather than nothing
+        return samples, None
+
+    pause_lengths = (starts[1:] - ends[:-1]) * VAD_FRAME_SECONDS
+    speech_seconds = float((ends - starts).sum() * VAD_FRAME_SECONDS)
+    pause_stats = {
+        "recorded_seconds": round(recorded_seconds, 2),
+        "speech_seconds": round(speech_seconds, 2),
+        "leading_silence_seconds": round(float(starts[0] * VAD_FRAME_SECONDS), 2),
+        "trailing_silence_seconds": round(float(max(recorded_seconds - ends[-1] * VAD_FRAME_SECONDS, 0)), 2),
+        "pause_count": int(len(pause_lengths)),
+        "long_pause_count": int(np.count_nonzero(pause_lengths >= LONG_PAUSE_SECONDS)),
+        "mean_pause_seconds": round(float(pause_lengths.mean()), 2) if len(pause_lengths) else 0.0,
+        "longest_pause_seconds": round(float(pause_lengths.max()), 2) if len(pause_lengths) else 0.0,
+        "total_pause_seconds": round(float(pause_lengths.sum()), 2),
+    }
+
+    # Keep each speech run plus half of the allowed pause on either side of it
+    margin = int(EDGE_MARGIN_SECONDS * sample_rate)
+    half_pause = int(MAX_PAUSE_SECONDS * sample_rate / 2)
+    pieces = []
+    for index, (start, end) in enumerate(zip(starts * frame_length, ends * frame_length)):
+        before = margin if index == 0 else half_pause
+        after = margin if index == len(starts) - 1 else half_pause
+        piece_start = max(start - before, pieces[-1][1] if pieces else 0)
+        pieces.append((piece_start, min(end + after, len(samples))))
+    trimmed = np.concatenate([samples[start:end] for start, end in pieces])
+    pause_stats["sent_seconds"] = round(len(trimmed) / sample_rate, 2)
+    return trimmed, pause_stats
+
+
+# Split a long recording into chunks of about chunk_seconds, cutting in the middle of a pause where
+# one is found in the last quarter of the chunk. Without a pause the cut is hard, and the chunk runs
+# overlap_seconds past it so no word is lost. Returns (start, end, overlaps_previous) sample ranges.
+def split_on_silence(samples, sample_rate, chunk_seconds, overlap_seconds):
+    speech = detect_speech(samples, sample_rate)
+    frame_length = max(int(sample_rate * VAD_FRAME_SECONDS), 1)
+    chunk_length = int(chunk_seconds * sample_rate)
+    overlap_length = int(overlap_seconds * sample_rate)
+
+    ranges = []
+    start = 0
+    overlaps_previous = False
+    # The last chunk may run up to a quarter longer rather than leave a tiny remainder
+    while len(samples) - start > chunk_length * 1.25:
+        ideal_cut = start + chunk_length
+        window_start = (ideal_cut - chunk_length // 4) // frame_length
+        window_end = ideal_cut // frame_length
+        pause_starts, pause_ends = find_runs(~speech[window_start:window_end])
+        if len(pause_starts):
+            cut = int(window_start + (pause_starts[-1] + pause_ends[-1]) // 2) * frame_length
+            ranges.append((start, cut, overlaps_previous))
+            overlaps_previous = False
+        else:
+            cut = ideal_cut
+            ranges.append((start, min(cut + overlap_length, len(samples)), overlaps_previous))
+            overlaps_previous = True
+        start = cut
+    ranges.append((start, len(samples), overlaps_previous))
+    return ranges
+
+
+# Shrink the upload before sending: WAVs are downmixed to mono, resampled to TARGET_SAMPLE_RATE,
+# trimmed of dead air and re-encoded as 16-bit PCM. Compressed formats can't be decoded with
+# NumPy, so they are sent as they are, but with their real MIME type.
+def normalize_audio(data, trim=TRIM_SILENCE):
+    mime_type = detect_mime_type(data)
+    if mime_type != "audio/wav":
+        return PreparedAudio(data, mime_type, None, None, None, None)
+    try:
+        samples, sample_rate = decode_wav(data)
+    except ValueError:
+        return PreparedAudio(data, mime_type, None, None, None, None)
+
+    target_rate = min(sample_rate, TARGET_SAMPLE_RATE)
+    samples = resample(to_mono(samples), sample_rate, target_rate)
+    # One VAD pass feeds both the acoustic features and the trimming
+    speech = detect_speech(samples, target_rate)
+    features = extract_features(samples, target_rate, speech, VAD_FRAME_SECONDS)
+    # Already compact (e.g. 16 kHz mono 16-bit): without trimming there is nothing to gain
+    if not trim and len(samples) * 2 + 44 >= len(data):
+        return PreparedAudio(data, mime_type, None, samples, target_rate, features)
+
+    pause_stats = None
+    if trim:
+        samples, pause_stats = trim_silence(samples, target_rate, speech)
+    return PreparedAudio(encode_wav(samples, target_rate), mime_type, pause_stats, samples, target_rate, features)
+
+
+# Hold the prepared audio for the duration of a request, within the per-request
+# ceiling and process budget. Yields a PreparedAudio.
+@contextmanager
+def audio_payload(audio_file):
+    size = audio_size(audio_file)
+    if size > MAX_AUDIO_MB * 1024 * 1024:
+        raise AudioTooLargeError(
+            f"The audio file is {size / (1024 * 1024):.1f} MB, but the limit is {MAX_AUDIO_MB:g} MB. "
+            "Please upload a shorter or compressed recording."
+        )
+    with _audio_budget.reserve(size * DECODE_MEMORY_FACTOR):
+        audio = normalize_audio(read_audio_data(audio_file))
+        if len(audio.data) > INLINE_AUDIO_LIMIT_MB * 1024 * 1024:
+            raise AudioTooLargeError(
+                f"The recording is still {len(audio.data) / (1024 * 1024):.1f} MB after compression, "
+                f"but requests are limited to {INLINE_AUDIO_LIMIT_MB} MB. Please upload a shorter recording."
+            )
+        yield audio
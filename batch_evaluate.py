@@ -0,0 +1,170 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from evaluation_pipeline import evaluate_recording, open_evaluation_cache
+from gemini_client import get_model
+from practice_content import DIFFICULTY_LEVELS, MAX_DURATION, MIN_DURATION
+
+
+# Evaluate a folder of recordings, or the recordings listed in a manifest CSV, and write
+# one JSON line per recording.
+#
+#   python batch_evaluate.py recordings/ --topic "My Hometown" --duration 2 --difficulty Intermediate
+#   python batch_evaluate.py class.csv --workers 8 --output class-results.jsonl
+#
+# A manifest has a "file" column (paths relative to the manifest) and optional "topic",
+# "duration" and "difficulty" columns; empty cells fall back to the command-line values.
+# Recordings already evaluated successfully in the output file are skipped, so an
+# interrupted run can simply be restarted.
+
+AUDIO_EXTENSIONS = {".mp3", ".wav", ".m4a", ".flac", ".ogg", ".webm", ".aiff", ".aac"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a batch of recordings and write the results as JSONL.")
+    parser.add_argument("source", help="Folder of recordings, or a manifest CSV")
+    parser.add_argument("--output", default="evaluations.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"), help="Gemini API key (defaults to $API_KEY)")
+    parser.add_argument("--workers", type=int, default=4, help="Recordings evaluated at the same time")
+    parser.add_argument("--topic", help="Topic for recordings without one in the manifest")
+    parser.add_argument("--duration", type=int, default=2, help="Expected speaking time in minutes (default: 2)")
+    parser.add_argument("--difficulty", choices=DIFFICULTY_LEVELS, default="Intermediate",
+                        help="Learner level (default: Intermediate)")
+    parser.add_argument("--single-pass", action="store_true",
+                        help="Transcribe and score each recording in one request")
+    parser.add_argument("--no-cache", action="store_true", help="Don't reuse or store cached evaluations")
+    return parser.parse_args(argv)
+
+
+# (path, label, topic, duration, difficulty) for every recording to evaluate
+def load_jobs(args):
+    source = Path(args.source)
+    if source.is_dir():
+        rows = [
+            {"file": path.name} for path in sorted(source.iterdir())
+            if path.is_file() and path.suffix.lower() in AUDIO_EXTENSIONS
+        ]
+        base = source
+    else:
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+        base = source.parent
+
+    jobs = []
+    for line, row in enumerate(rows, start=2):
+        label = (row.get("file") or "").strip()
+        if not label:
+            raise ValueError(f"{source}:{line}: missing file")
+        topic = (row.get("topic") or "").strip() or args.topic
+        duration = int((row.get("duration") or "").strip() or args.duration)
+        difficulty = (row.get("difficulty") or "").strip() or args.difficulty
+        if not topic:
+            raise ValueError(f"{label}: no topic (add a topic column or pass --topic)")
+        if not MIN_DURATION <= duration <= MAX_DURATION:
+            raise ValueError(f"{label}: duration must be {MIN_DURATION}-{MAX_DURATION} minutes")
+        if difficulty not in DIFFICULTY_LEVELS:
+            raise ValueError(f"{label}: difficulty must be one of {', '.join(DIFFICULTY_LEVELS)}")
+        jobs.append((base / label, label, topic, duration, difficulty))
+    return jobs
+
+
+# Files with a successful result already in the output
+def completed_files(path):
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("status") == "ok":
+                done.add(record["file"])
+    return done
+
+
+# Evaluate one recording and return its result line, timing each pipeline stage
+def evaluate_file(model, cache, single_pass, path, label, topic, duration, difficulty):
+    started = time.monotonic()
+    # Seconds spent per stage; a stage entered twice (a single-pass fallback) adds up
+    timings = {}
+    current = {"stage": None, "since": started}
+
+    def end_stage(now):
+        if current["stage"] not in (None, "done"):
+            timings[current["stage"]] = timings.get(current["stage"], 0) + now - current["since"]
+
+    def progress(stage, message):
+        now = time.monotonic()
+        end_stage(now)
+        current.update(stage=stage, since=now)
+
+    record = {"file": label, "topic": topic, "duration": duration, "difficulty": difficulty}
+    try:
+        record["evaluation"] = evaluate_recording(
+            model, path, topic, duration, difficulty, single_pass=single_pass, cache=cache, progress=progress
+        )
+        record["status"] = "ok"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = str(e)
+        details = getattr(e, "details", None)
+        if details:
+            record["details"] = details
+    finished = time.monotonic()
+    end_stage(finished)
+
+    record["timings"] = {stage: round(seconds, 3) for stage, seconds in timings.items()}
+    record["seconds"] = round(finished - started, 3)
+    return record
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        print("A Gemini API key is required (--api-key or $API_KEY).", file=sys.stderr)
+        return 2
+    try:
+        jobs = load_jobs(args)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    done = completed_files(args.output)
+    pending = [job for job in jobs if job[1] not in done]
+    total = len(pending)
+    print(f"{len(jobs) - total} of {len(jobs)} recordings already in {args.output}; "
+          f"evaluating {total} with {args.workers} workers")
+    if not total:
+        return 0
+
+    model = get_model(args.api_key)
+    cache = None if args.no_cache else open_evaluation_cache()
+    failures = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor, open(args.output, "a", encoding="utf-8") as output:
+        futures = [executor.submit(evaluate_file, model, cache, args.single_pass, *job) for job in pending]
+        for finished, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+            if record["status"] == "ok":
+                scores = ", ".join(f"{key} {value}" for key, value in record["evaluation"]["scores"].items())
+                print(f"[{finished}/{total}] {record['file']}: {scores} ({record['seconds']:.0f}s)")
+            else:
+                failures += 1
+                print(f"[{finished}/{total}] FAILED {record['file']}: {record['error']}", file=sys.stderr)
+
+    print(f"Done in {time.time() - started:.0f}s: {total - failures} evaluated, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+import argparse
+import io
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from audio_processing import encode_wav
+from batch_evaluate import evaluate_file
+from gemini_client import wrap_model
+from mock_gemini import MockModel, load_responses
+from practice_content import DIFFICULTY_LEVELS, TOPIC_OPTIONS, build_content_prompt, format_content
+from radar_chart import radar_chart_png, radar_chart_svg
+from speech_evaluation import SCORE_KEYS
+
+
+# End-to-end latency benchmark against the local mock backend, no API key needed.
+#
+#   python benchmark.py --sessions 8 --evaluations 3 --latency-scale 0.05
+#
+# Each simulated session generates practice content, then evaluates synthetic recordings and
+# draws the score chart, all through the same rate limiter and call policies as the app.
+# Reports p50/p95/p99 per stage, bytes sent per evaluation and evaluations per minute.
+# With --json the report is saved; with --compare a saved report is the baseline and a p95
+# more than --tolerance slower fails the run.
+
+SAMPLE_RATE = 16000
+PERCENTILES = [50, 95, 99]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the evaluation pipeline against the mock Gemini backend.")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent simulated sessions")
+    parser.add_argument("--evaluations", type=int, default=3, help="Recordings evaluated per session")
+    parser.add_argument("--audio-seconds", type=float, default=60, help="Length of each synthetic recording")
+    parser.add_argument("--latency-scale", type=float, default=0.05,
+                        help="Multiplier on the mock's realistic latencies (1 = real time)")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="Spread of the mock's log-normal latencies")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of mock requests failing with 503")
+    parser.add_argument("--responses", help="JSON file of recorded responses to replay")
+    parser.add_argument("--single-pass", action="store_true", help="Transcribe and score in one request")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for latencies, errors and recordings")
+    parser.add_argument("--json", help="Write the report to this file")
+    parser.add_argument("--compare", help="Baseline report to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 slowdown against the baseline")
+    return parser.parse_args(argv)
+
+
+# Speech-like test audio: voiced bursts with harmonics separated by pauses of varying length
+def synthetic_recording(seconds, seed):
+    rng = np.random.default_rng(seed)
+    samples = np.zeros(int(seconds * SAMPLE_RATE), np.float32)
+    position = int(rng.uniform(0.3, 1.0) * SAMPLE_RATE)
+    while position < len(samples):
+        length = int(rng.uniform(0.15, 0.6) * SAMPLE_RATE)
+        t = np.arange(min(length, len(samples) - position)) / SAMPLE_RATE
+        pitch = rng.uniform(110, 220) * (1 + 0.1 * np.sin(2 * np.pi * 3 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+        voice = sum(np.sin(phase * harmonic) / harmonic for harmonic in (1, 2, 3))
+        envelope = np.sin(np.pi * t / t[-1]) if len(t) > 1 else t
+        samples[position:position + len(t)] = 0.3 * voice * envelope
+        position += length + int(rng.choice([0.08, 0.15, 0.3, 0.8, 1.5], p=[0.4, 0.3, 0.15, 0.1, 0.05]) * SAMPLE_RATE)
+    samples += rng.normal(0, 0.003, len(samples)).astype(np.float32)
+    return encode_wav(samples, SAMPLE_RATE)
+
+
+# Nearest-rank percentile of a list of numbers
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[max(int(round(p / 100 * len(ordered))) - 1, 0)]
+
+
+def run_session(model, index, args, recordings):
+    timings = {"content": [], "radar_svg": [], "radar_png": []}
+    stages = []
+    failures = []
+
+    started = time.monotonic()
+    topic = TOPIC_OPTIONS[index % len(TOPIC_OPTIONS)]
+    difficulty = DIFFICULTY_LEVELS[index % len(DIFFICULTY_LEVELS)]
+    # Sessions differ in duration so identical content requests aren't coalesced
+    prompt = build_content_prompt(topic, 1 + index % 10, "Prompt Questions", difficulty)
+    format_content(model.for_stage("content").generate_content(prompt).text, "Prompt Questions")
+    timings["content"].append(time.monotonic() - started)
+
+    for number in range(args.evaluations):
+        recording = io.BytesIO(recordings[(index * args.evaluations + number) % len(recordings)])
+        record = evaluate_file(model, None, args.single_pass, recording, f"session-{index}-{number}", topic, 2, difficulty)
+        if record["status"] != "ok":
+            failures.append(record["error"])
+            continue
+        stages.append(dict(record["timings"], evaluation=record["seconds"]))
+
+        scores = tuple(record["evaluation"]["scores"][key] for key in SCORE_KEYS)
+        categories = tuple(key.capitalize() for key in SCORE_KEYS)
+        for renderer, draw in (("radar_svg", radar_chart_svg), ("radar_png", radar_chart_png)):
+            # The uncached function, so every call measures a full render
+            chart_started = time.monotonic()
+            draw.__wrapped__(categories, scores)
+            timings[renderer].append(time.monotonic() - chart_started)
+
+    for stage_timings in stages:
+        for stage, seconds in stage_timings.items():
+            timings.setdefault(stage, []).append(seconds)
+    return timings, failures
+
+
+def build_report(args, timings, calls, evaluations, failures, wall_seconds):
+    sent = [size for kind, size, _, _ in calls if kind in ("transcription", "evaluation", "repair")]
+    return {
+        "settings": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+        "stages": {
+            stage: {f"p{p}": round(percentile(values, p), 4) for p in PERCENTILES} | {"count": len(values)}
+            for stage, values in timings.items() if values
+        },
+        "requests": {
+            kind: {"count": sum(1 for call in calls if call[0] == kind),
+                   "failed": sum(1 for call in calls if call[0] == kind and not call[3])}
+            for kind in sorted({call[0] for call in calls})
+        },
+        "bytes_per_evaluation": round(sum(sent) / evaluations) if evaluations else 0,
+        "evaluations": evaluations,
+        "failed_evaluations": len(failures),
+        "evaluations_per_minute": round(evaluations / wall_seconds * 60, 1),
+        "wall_seconds": round(wall_seconds, 2),
+    }
+
+
+def print_report(report):
+    print(f"{'stage':<14}{'count':>7}" + "".join(f"{f'p{p} ms':>11}" for p in PERCENTILES))
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<14}{stats['count']:>7}" + "".join(f"{stats[f'p{p}'] * 1000:>11.1f}" for p in PERCENTILES))
+    print()
+    for kind, counts in report["requests"].items():
+        print(f"{kind:<18}{counts['count']:>5} requests, {counts['failed']} failed")
+    print(f"\nBytes sent per evaluation: {report['bytes_per_evaluation']:,}")
+    print(f"Evaluations: {report['evaluations']} ok, {report['failed_evaluations']} failed in "
+          f"{report['wall_seconds']:.1f} s ({report['evaluations_per_minute']:.1f} per minute)")
+
+
+# Stages whose p95 grew by more than the tolerance against the baseline report
+def regressions(report, baseline, tolerance):
+    slower = []
+    for stage, stats in report["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if previous and stats["p95"] > previous["p95"] * (1 + tolerance):
+            slower.append(f"{stage}: p95 {previous['p95'] * 1000:.1f} -> {stats['p95'] * 1000:.1f} ms")
+    return slower
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    mock = MockModel(
+        responses=load_responses(args.responses) if args.responses else None,
+        latency_scale=args.latency_scale, latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate, seed=args.seed
+    )
+    # Distinct recordings, so no two evaluations are coalesced into one request
+    recordings = [synthetic_recording(args.audio_seconds, args.seed + i) for i in range(args.sessions * args.evaluations)]
+    print(f"Benchmarking {args.sessions} sessions x {args.evaluations} evaluations of "
+          f"{args.audio_seconds:g} s recordings (latency scale {args.latency_scale:g})\n")
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.sessions) as executor:
+        results = list(executor.map(
+            lambda index: run_session(wrap_model(mock, "benchmark", f"session-{index}"), index, args, recordings),
+            range(args.sessions)
+        ))
+    wall_seconds = time.monotonic() - started
+
+    timings = {}
+    failures = []
+    for session_timings, session_failures in results:
+        for stage, values in session_timings.items():
+            timings.setdefault(stage, []).extend(values)
+        failures.extend(session_failures)
+    evaluations = len(timings.get("evaluation", []))
+    report = build_report(args, timings, list(mock.calls), evaluations, failures, wall_seconds)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    status = 1 if failures else 0
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = regressions(report, json.load(f), args.tolerance)
+        if slower:
+            print("\nSlower than the baseline:\n  " + "\n  ".join(slower), file=sys.stderr)
+            status = 1
+    for error in sorted(set(failures)):
+        print(f"Failed evaluation: {error}", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
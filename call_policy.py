@@ -0,0 +1,144 @@
+import os
+import random
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+from metrics import GEMINI_HEDGES, GEMINI_RETRIES
+from rate_limit import RateLimitTimeout
+
+
+# Deadline and retry budget for one kind of model call. The deadline covers every attempt,
+# backoff sleeps included.
+CallPolicy = namedtuple("CallPolicy", ["deadline_seconds", "max_attempts"])
+
+STAGE_POLICIES = {
+    "default": CallPolicy(60, 3),
+    "content": CallPolicy(90, 3),
+    "transcription": CallPolicy(180, 4),
+    "evaluation": CallPolicy(180, 3),
+}
+
+# Backoff before retry n is drawn uniformly from [0, min(cap, base * 2**n)] ("full jitter")
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 20.0
+
+# Send a second, identical attempt when the first runs past the stage's p95 latency
+HEDGE_REQUESTS = os.environ.get("GEMINI_HEDGE_REQUESTS", "0") == "1"
+# Latencies needed before a stage's p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+
+
+# The stage's deadline passed before any attempt succeeded
+class CallDeadlineExceeded(TimeoutError):
+    pass
+
+
+# Overloaded or unreachable service: worth another attempt. Waiting too long for our own
+# rate limiter is not, since a retry would just queue again.
+def is_retryable(error):
+    # Only reached after a call failed, by which time the SDK's exceptions are loaded anyway
+    from google.api_core import exceptions as api_exceptions
+
+    retryable = (
+        api_exceptions.TooManyRequests,
+        api_exceptions.ServiceUnavailable,
+        api_exceptions.InternalServerError,
+        api_exceptions.BadGateway,
+        api_exceptions.GatewayTimeout,
+        api_exceptions.DeadlineExceeded,
+        ConnectionError,
+        TimeoutError,
+    )
+    return isinstance(error, retryable) and not isinstance(error, RateLimitTimeout)
+
+
+# Recent successful call latencies per stage
+class LatencyTracker:
+    def __init__(self, window=200):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._window = window
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self._window)).append(seconds)
+
+    def p95(self, stage):
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+
+latencies = LatencyTracker()
+
+
+# Run attempt(timeout) on a thread of its own. A shared pool would make attempts queue for a
+# worker when many calls are hedged at once, and a queued attempt would look slow and be hedged.
+def _start_attempt(attempt, timeout):
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(attempt(timeout))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="model-attempt", daemon=True).start()
+    return future
+
+
+# Run attempt(timeout) and, if it is still running after hedge_after seconds, a second copy;
+# the first success wins. The slower copy is left to finish in the background.
+def _hedged(attempt, hedge_after, timeout, stage):
+    started = time.monotonic()
+    futures = [_start_attempt(attempt, timeout)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        GEMINI_HEDGES.labels(stage=stage).inc()
+        futures.append(_start_attempt(attempt, max(timeout - (time.monotonic() - started), 0.1)))
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(timeout - (time.monotonic() - started), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            raise CallDeadlineExceeded("Model call timed out")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+# Call attempt(timeout_seconds) under the stage's policy: retry retryable errors with jittered
+# exponential backoff until the deadline or the attempt budget runs out, hedging slow attempts
+# when enabled. Non-retryable errors are raised straight away.
+def call_with_policy(attempt, stage="default", hedge=HEDGE_REQUESTS):
+    policy = STAGE_POLICIES.get(stage, STAGE_POLICIES["default"])
+    deadline = time.monotonic() + policy.deadline_seconds
+    for attempt_number in range(policy.max_attempts):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise CallDeadlineExceeded(f"Model call did not finish within {policy.deadline_seconds:g} s")
+        started = time.monotonic()
+        try:
+            hedge_after = latencies.p95(stage) if hedge else None
+            if hedge_after is not None and hedge_after < remaining:
+                result = _hedged(attempt, hedge_after, remaining, stage)
+            else:
+                result = attempt(remaining)
+        except Exception as e:
+            if not is_retryable(e) or attempt_number == policy.max_attempts - 1:
+                raise
+            backoff = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt_number))
+            if time.monotonic() + backoff >= deadline:
+                raise
+            GEMINI_RETRIES.labels(stage=stage).inc()
+            time.sleep(backoff)
+            continue
+        latencies.record(stage, time.monotonic() - started)
+        return result
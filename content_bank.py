@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+
+from metrics import CACHE_LOOKUPS
+from practice_content import CONTENT_PROMPT_VERSION
+
+
+# Pre-generated practice content, one JSON record per line, built by prewarm_content.py
+CONTENT_BANK_PATH = os.environ.get("CONTENT_BANK_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content_bank.jsonl"))
+
+
+def bank_key(topic, duration, difficulty, content_type):
+    return topic, int(duration), difficulty, content_type
+
+
+# Local store of parsed practice content keyed by topic, duration, difficulty and content type.
+# Records are appended as they are generated, so an interrupted build keeps everything finished so far.
+# Each record carries the prompt version it was generated with; records from other versions are
+# skipped on load, so editing a content template retires the entries built from the old one.
+class ContentBank:
+    def __init__(self, path=CONTENT_BANK_PATH, prompt_version=CONTENT_PROMPT_VERSION):
+        self.path = path
+        self.prompt_version = prompt_version
+        # Records skipped because they were generated from a different prompt version
+        self.stale = 0
+        self._entries = {}
+        self._served = {}
+        self._lock = threading.Lock()
+        self._needs_newline = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            data = f.read()
+        # A build killed mid-write can leave a partial last line
+        self._needs_newline = bool(data) and not data.endswith("\n")
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                key = bank_key(record["topic"], record["duration"], record["difficulty"], record["content_type"])
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+                continue
+            if record.get("prompt_version") != self.prompt_version:
+                self.stale += 1
+                continue
+            self._entries.setdefault(key, []).append(record["content"])
+
+    def __len__(self):
+        return sum(len(variants) for variants in self._entries.values())
+
+    def count(self, topic, duration, difficulty, content_type):
+        return len(self._entries.get(bank_key(topic, duration, difficulty, content_type), []))
+
+    # Return stored content for this combination, rotating through variants, or None on a miss
+    def get(self, topic, duration, difficulty, content_type):
+        key = bank_key(topic, duration, difficulty, content_type)
+        with self._lock:
+            variants = self._entries.get(key)
+            if not variants:
+                CACHE_LOOKUPS.labels(cache="content_bank", result="miss").inc()
+                return None
+            CACHE_LOOKUPS.labels(cache="content_bank", result="hit").inc()
+            position = self._served.get(key, 0)
+            self._served[key] = position + 1
+            return variants[position % len(variants)]
+
+    def add(self, topic, duration, difficulty, content_type, content):
+        key = bank_key(topic, duration, difficulty, content_type)
+        record = {
+            "topic": topic,
+            "duration": int(duration),
+            "difficulty": difficulty,
+            "content_type": content_type,
+            "prompt_version": self.prompt_version,
+            "content": content
+        }
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self._needs_newline:
+                    f.write("\n")
+                    self._needs_newline = False
+                f.write(line)
+                f.flush()
+            self._entries.setdefault(key, []).append(content)
@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import CACHE_LOOKUPS
+
+
+# Default location for on-disk caches, next to the app unless overridden
+CACHE_DIR = os.environ.get("SPEECH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+# A connection per operation keeps the SQLite stores safe across threads and processes
+@contextmanager
+def sqlite_connection(path, row_factory=None):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = row_factory
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+# Create a store's directory and tables, in WAL mode so readers don't wait for a writer
+def init_sqlite(path, *statements):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with sqlite_connection(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in statements:
+            conn.execute(statement)
+
+
+# SQLite-backed key/value cache with TTL, a total size cap and LRU eviction.
+# A key can hold several variants; reads rotate through them round-robin.
+class DiskCache:
+    def __init__(self, path, ttl_seconds=None, max_bytes=50 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # Label for this cache's lookups in the metrics ("content", "evaluations", ...)
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self._lock = threading.Lock()
+
+        init_sqlite(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (key, variant)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)",
+        )
+
+    def _expire(self, conn, now):
+        if self.ttl_seconds is not None:
+            conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,))
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute("SELECT key, variant, size FROM entries ORDER BY accessed").fetchall()
+        for key, variant, size in rows:
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ? AND variant = ?", (key, variant))
+            total -= size
+
+    # Return a cached value, or None on a miss. With variants > 1, a miss is also
+    # reported until that many variants are stored, so callers generate fresh ones.
+    def get(self, key, variants=1):
+        now = time.time()
+        with self._lock, sqlite_connection(self.path) as conn:
+            self._expire(conn, now)
+            rows = conn.execute(
+                "SELECT variant, value FROM entries WHERE key = ? ORDER BY accessed LIMIT ?",
+                (key, variants)
+            ).fetchall()
+            if len(rows) < variants:
+                CACHE_LOOKUPS.labels(cache=self.name, result="miss").inc()
+                return None
+            # The least recently served variant is next in the rotation
+            variant, value = rows[0]
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ? AND variant = ?", (now, key, variant))
+        CACHE_LOOKUPS.labels(cache=self.name, result="hit").inc()
+        return json.loads(value)
+
+    # Store a value; once a key holds `variants` values the oldest one is replaced
+    def put(self, key, value, variants=1):
+        now = time.time()
+        serialized = json.dumps(value)
+        with self._lock, sqlite_connection(self.path) as conn:
+            self._expire(conn, now)
+            existing = conn.execute(
+                "SELECT variant FROM entries WHERE key = ? ORDER BY created", (key,)
+            ).fetchall()
+            used = [row[0] for row in existing]
+            if len(used) >= variants:
+                variant = used[0]
+            else:
+                variant = next(index for index in range(variants) if index not in used)
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, variant, value, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, variant, serialized, len(serialized.encode("utf-8")), now, now)
+            )
+            self._evict(conn)
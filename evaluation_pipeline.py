@@ -0,0 +1,236 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from disk_cache import CACHE_DIR, DiskCache
+from gemini_client import request_fingerprint
+from metrics import EVALUATIONS, SINGLE_PASS_FALLBACKS, STAGE_SECONDS
+from speech_evaluation import (
+    EVALUATION_FIELDS, PROMPT_VERSION, TRANSCRIPTION_PROMPT, build_evaluation_prompt, build_repair_prompt,
+    evaluation_problems, merge_evaluation, parse_evaluation_response, stitch_transcripts, structured_output_config
+)
+
+
+# Transcription and evaluation without any Streamlit calls, so it can run on a worker thread.
+# Progress is reported through a progress(stage, message) callback and failures are raised
+# as EvaluationError with a message meant for the learner.
+
+# Recordings longer than two chunks are transcribed as chunks of about this many seconds
+TRANSCRIBE_CHUNK_SECONDS = float(os.environ.get("TRANSCRIBE_CHUNK_SECONDS", "60"))
+# Overlap added where a chunk has to be cut without a pause
+TRANSCRIBE_CHUNK_OVERLAP_SECONDS = 2
+# Chunks transcribed at the same time for one recording
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "4"))
+# Follow-up requests for fields missing from an evaluation before giving up on it
+EVALUATION_REPAIR_ATTEMPTS = 1
+# Ask for evaluations as schema-constrained JSON instead of describing the format in the prompt
+STRUCTURED_OUTPUT = os.environ.get("STRUCTURED_OUTPUT", "1") == "1"
+
+# Finished evaluations keyed by recording and settings; size-bounded, entries stay until evicted
+EVALUATION_CACHE_MAX_MB = float(os.environ.get("EVALUATION_CACHE_MAX_MB", "100"))
+
+# Stages reported to the progress callback, in order
+STAGES = ["preparing", "transcribing", "evaluating", "done"]
+
+
+# An evaluation that could not be completed; details holds raw model output worth showing, if any
+class EvaluationError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details
+
+
+# The on-disk evaluation cache used by the app and by batch runs
+def open_evaluation_cache():
+    return DiskCache(
+        os.path.join(CACHE_DIR, "evaluations.sqlite3"),
+        max_bytes=int(EVALUATION_CACHE_MAX_MB * 1024 * 1024)
+    )
+
+
+def _no_progress(stage, message):
+    pass
+
+
+# Transcribe one chunk; a failed chunk is retried on its own under the transcription policy
+def transcribe_chunk(model, chunk_data):
+    response = model.for_stage("transcription").generate_content([
+        TRANSCRIPTION_PROMPT,
+        {"mime_type": "audio/wav", "data": chunk_data}
+    ])
+    return response.text.strip()
+
+
+# Transcribe a long recording as chunks split at pauses, in parallel, and stitch them in order
+def transcribe_in_chunks(model, audio):
+    from audio_processing import encode_wav, split_on_silence
+
+    ranges = split_on_silence(audio.samples, audio.sample_rate, TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP_SECONDS)
+    with ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS) as executor:
+        futures = [
+            executor.submit(transcribe_chunk, model, encode_wav(audio.samples[start:end], audio.sample_rate))
+            for start, end, _ in ranges
+        ]
+        parts = [future.result() for future in futures]
+    return stitch_transcripts(parts, [overlaps_previous for _, _, overlaps_previous in ranges])
+
+
+# Send prepared audio for a verbatim transcription
+def transcribe_prepared_audio(model, audio):
+    # Long decoded recordings are transcribed in parallel chunks
+    if audio.samples is not None and len(audio.samples) > TRANSCRIBE_CHUNK_SECONDS * 2 * audio.sample_rate:
+        return transcribe_in_chunks(model, audio)
+
+    response = model.for_stage("transcription").generate_content([
+        TRANSCRIPTION_PROMPT,
+        {"mime_type": audio.mime_type, "data": audio.data}
+    ])
+    return response.text.strip()
+
+
+# Extra generate_content arguments for an evaluation request returning these fields
+def evaluation_request_options(fields):
+    if not STRUCTURED_OUTPUT:
+        return {}
+    return {"generation_config": structured_output_config(fields)}
+
+
+# Ask again for just the fields an evaluation is missing or got wrong, keeping the rest
+def complete_evaluation(model, evaluation_results, topic, duration, difficulty, transcription):
+    for _ in range(EVALUATION_REPAIR_ATTEMPTS):
+        fields = evaluation_problems(evaluation_results)
+        if not fields:
+            break
+        repair_prompt = build_repair_prompt(
+            evaluation_results, fields, topic, duration, difficulty, transcription, structured=STRUCTURED_OUTPUT
+        )
+        try:
+            with STAGE_SECONDS.labels(stage="repair").time():
+                repair = parse_evaluation_response(
+                    model.for_stage("evaluation").generate_content(repair_prompt, **evaluation_request_options(fields)).text
+                )
+        except json.JSONDecodeError:
+            continue
+        evaluation_results = merge_evaluation(evaluation_results, repair, fields)
+    return evaluation_results
+
+
+# Transcribe and evaluate in a single request; returns None if the answer fails validation
+def evaluate_single_pass(model, audio, topic, duration, difficulty):
+    evaluation_prompt = build_evaluation_prompt(
+        topic, duration, difficulty, pause_stats=audio.pause_stats, features=audio.features,
+        structured=STRUCTURED_OUTPUT
+    )
+    with STAGE_SECONDS.labels(stage="single_pass_evaluation").time():
+        response = model.for_stage("evaluation").generate_content([
+            evaluation_prompt,
+            {"mime_type": audio.mime_type, "data": audio.data}
+        ], **evaluation_request_options(list(EVALUATION_FIELDS) + ["raw_transcription"]))
+    try:
+        with STAGE_SECONDS.labels(stage="parse_response").time():
+            evaluation_results = parse_evaluation_response(response.text)
+    except json.JSONDecodeError:
+        return None
+    # Without the transcription the missing fields can't be asked for from text alone
+    if "raw_transcription" in evaluation_problems(evaluation_results, require_transcription=True):
+        return None
+    evaluation_results["raw_transcription"] = evaluation_results["raw_transcription"].strip()
+    evaluation_results = complete_evaluation(
+        model, evaluation_results, topic, duration, difficulty, evaluation_results["raw_transcription"]
+    )
+    if evaluation_problems(evaluation_results):
+        return None
+    return evaluation_results
+
+
+# Evaluate in two requests: a verbatim transcription, then scoring of the text
+def evaluate_two_step(model, audio, topic, duration, difficulty, progress):
+    progress("transcribing", "Transcribing your audio...")
+    try:
+        with STAGE_SECONDS.labels(stage="transcription").time():
+            transcription = transcribe_prepared_audio(model, audio)
+    except Exception as e:
+        raise EvaluationError(f"Error transcribing audio: {str(e)}")
+    if not transcription:
+        raise EvaluationError("Failed to transcribe audio. Please try again.")
+
+    progress("evaluating", "Audio transcribed successfully! Evaluating your speech...")
+    # Prepare evaluation prompt with the actual transcription and measured pauses
+    evaluation_prompt = build_evaluation_prompt(
+        topic, duration, difficulty, transcription, audio.pause_stats, audio.features,
+        structured=STRUCTURED_OUTPUT
+    )
+    with STAGE_SECONDS.labels(stage="evaluation").time():
+        response = model.for_stage("evaluation").generate_content(
+            evaluation_prompt, **evaluation_request_options(list(EVALUATION_FIELDS))
+        )
+    try:
+        with STAGE_SECONDS.labels(stage="parse_response").time():
+            evaluation_results = parse_evaluation_response(response.text)
+    except json.JSONDecodeError as e:
+        raise EvaluationError(f"Failed to parse the AI response as JSON. Error: {e}", details=response.text)
+    evaluation_results["raw_transcription"] = transcription
+
+    evaluation_results = complete_evaluation(model, evaluation_results, topic, duration, difficulty, transcription)
+    missing = evaluation_problems(evaluation_results)
+    if missing:
+        raise EvaluationError(f"The evaluation came back incomplete (missing {', '.join(missing)}). Please try again.")
+    return evaluation_results
+
+
+# Full evaluation of an uploaded recording. With a cache (a DiskCache), the same normalized
+# recording evaluated with the same settings, prompts and model makes no API call.
+def evaluate_recording(model, audio_file, topic, duration, difficulty, single_pass=False, cache=None, progress=None):
+    # audio_processing pulls in numpy, so it is loaded with the first recording, not at startup
+    from audio_processing import audio_payload
+
+    progress = progress or _no_progress
+    started = time.monotonic()
+    try:
+        progress("preparing", "Preparing your recording...")
+        # Decode, trim and compress the recording once for every request below
+        with ExitStack() as stack:
+            with STAGE_SECONDS.labels(stage="prepare_audio").time():
+                audio = stack.enter_context(audio_payload(audio_file))
+            cache_key = request_fingerprint(
+                model, audio.data, topic, str(duration), difficulty, PROMPT_VERSION,
+                "single-pass" if single_pass else "two-step", "structured" if STRUCTURED_OUTPUT else "prompted"
+            )
+            evaluation_results = cache.get(cache_key) if cache is not None else None
+            # Entries cached before answers were validated may be incomplete; those are evaluated again
+            if evaluation_results is not None and not evaluation_problems(evaluation_results):
+                EVALUATIONS.labels(outcome="cached").inc()
+                progress("done", "Loaded your earlier evaluation of this recording.")
+                return evaluation_results
+
+            evaluation_results = None
+            if single_pass:
+                progress("evaluating", "Transcribing and evaluating your speech...")
+                # Only an answer that fails validation is retried in two steps; errors calling the
+                # model (deadline, quota, rejected key) would fail the second way too, so they are raised
+                evaluation_results = evaluate_single_pass(model, audio, topic, duration, difficulty)
+                if not evaluation_results:
+                    SINGLE_PASS_FALLBACKS.inc()
+                    progress("transcribing", "The single-request evaluation was incomplete, so your speech is being evaluated in two steps.")
+            if not evaluation_results:
+                evaluation_results = evaluate_two_step(model, audio, topic, duration, difficulty, progress)
+
+            # Keep the measured audio statistics with the evaluation
+            evaluation_results["pause_stats"] = audio.pause_stats
+            evaluation_results["acoustic_features"] = audio.features
+            if cache is not None:
+                cache.put(cache_key, evaluation_results)
+            EVALUATIONS.labels(outcome="ok").inc()
+            progress("done", "Evaluation complete!")
+            return evaluation_results
+    except EvaluationError:
+        EVALUATIONS.labels(outcome="failed").inc()
+        raise
+    except Exception as e:
+        EVALUATIONS.labels(outcome="failed").inc()
+        raise EvaluationError(f"Error evaluating speech: {str(e)}")
+    finally:
+        # Every run is timed, including cache hits and failures, so slow failing runs show up too
+        STAGE_SECONDS.labels(stage="evaluate_recording").observe(time.monotonic() - started)
@@ -0,0 +1,365 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from call_policy import HEDGE_REQUESTS, STAGE_POLICIES, CallDeadlineExceeded, call_with_policy
+from metrics import (
+    GEMINI_BYTES, GEMINI_COALESCED, GEMINI_QUEUE_SECONDS, GEMINI_REQUEST_SECONDS, GEMINI_REQUESTS, GEMINI_TOKENS
+)
+from rate_limit import FairRateLimiter, InflightRequests
+
+
+MODEL_NAME = "gemini-2.0-flash"
+
+# "gemini" calls the API; "mock" answers locally from recorded responses (see mock_gemini.py)
+GEMINI_BACKEND = os.environ.get("GEMINI_BACKEND", "gemini")
+
+GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "top_p": 1,
+    "top_k": 32,
+    "max_output_tokens": 8192,
+}
+
+# Given by name so the Gemini SDK, slow to import, is only loaded once a model is built
+SAFETY_SETTINGS = {
+    "HARM_CATEGORY_HARASSMENT": "BLOCK_NONE",
+    "HARM_CATEGORY_HATE_SPEECH": "BLOCK_NONE",
+    "HARM_CATEGORY_SEXUALLY_EXPLICIT": "BLOCK_NONE",
+    "HARM_CATEGORY_DANGEROUS_CONTENT": "BLOCK_NONE",
+}
+
+# Maximum number of (API key, model, config) clients kept alive in this process
+MAX_POOLED_CLIENTS = int(os.environ.get("GEMINI_CLIENT_POOL_SIZE", "32"))
+
+# Requests per minute allowed for each API key, shared by every session using it (0 disables)
+REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "60"))
+# Requests a key may send back to back before the per-minute rate applies
+REQUEST_BURST = int(os.environ.get("GEMINI_REQUEST_BURST", "10"))
+# Longest a request waits for its turn before giving up
+REQUEST_QUEUE_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_QUEUE_TIMEOUT_SECONDS", "120"))
+
+# Validated API keys are remembered (by digest only) for this long
+API_KEY_CACHE_TTL_HOURS = float(os.environ.get("API_KEY_CACHE_TTL_HOURS", "24"))
+API_KEY_CHECK_TIMEOUT_SECONDS = 10
+
+# Least recently used entries sit at the front and are evicted first
+_client_pool = OrderedDict()
+_pool_lock = threading.Lock()
+
+# genai.configure rewrites module-level state, so client construction is serialized
+_configure_lock = threading.Lock()
+
+
+# Rate limiter and in-flight request table for each API key digest, least recently used first
+_throttles = OrderedDict()
+_throttles_lock = threading.Lock()
+
+
+def _key_digest(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+
+def _pool_key(api_key, model_name, generation_config, safety_settings):
+    # Only a digest of the API key is kept as part of the pool key
+    key_digest = _key_digest(api_key)
+    config_key = json.dumps(generation_config, sort_keys=True)
+    safety_key = tuple(sorted((str(category), str(threshold)) for category, threshold in safety_settings.items()))
+    return key_digest, model_name, config_key, safety_key
+
+
+# Build a model whose transport is bound to one API key
+def _build_model(api_key, model_name, generation_config, safety_settings):
+    import google.generativeai as genai
+    from google.generativeai import client as genai_client
+
+    with _configure_lock:
+        genai.configure(api_key=api_key)
+        service_client = genai_client.get_default_generative_client()
+
+    model = genai.GenerativeModel(
+        model_name=model_name,
+        generation_config=generation_config,
+        safety_settings=safety_settings
+    )
+    # Pin the key-specific client so a later genai.configure from another session can't swap it out
+    model._client = service_client
+    return model
+
+
+def _build_mock_model(api_key, model_name, generation_config, safety_settings):
+    from mock_gemini import MockModel
+
+    return MockModel(model_name, generation_config)
+
+
+# Model builders by backend name. A backend's model needs a model_name and a
+# generate_content(contents, stream=False, generation_config=None, request_options=None).
+MODEL_BACKENDS = {
+    "gemini": _build_model,
+    "mock": _build_mock_model,
+}
+
+
+class _KeyThrottle:
+    def __init__(self):
+        self.limiter = FairRateLimiter(REQUESTS_PER_MINUTE / 60, REQUEST_BURST) if REQUESTS_PER_MINUTE > 0 else None
+        self.inflight = InflightRequests()
+
+    def busy(self):
+        return bool(len(self.inflight) or (self.limiter is not None and self.limiter.waiting()))
+
+
+# Throttles are kept for as many keys as the client pool holds. The least recently used idle
+# ones are dropped first; one with requests waiting or in flight is kept, since replacing it
+# would let the key's callers bypass its queue.
+def _throttle_for(api_key):
+    digest = _key_digest(api_key)
+    with _throttles_lock:
+        throttle = _throttles.get(digest)
+        if throttle is None:
+            throttle = _throttles[digest] = _KeyThrottle()
+        _throttles.move_to_end(digest)
+        if len(_throttles) > MAX_POOLED_CLIENTS:
+            idle = [old for old, old_throttle in _throttles.items() if old != digest and not old_throttle.busy()]
+            for old in idle[:len(_throttles) - MAX_POOLED_CLIENTS]:
+                del _throttles[old]
+        return throttle
+
+
+# Hashable description of a generate_content call: every content part plus the call options
+def _content_parts(contents):
+    if isinstance(contents, (list, tuple)):
+        for part in contents:
+            yield from _content_parts(part)
+    elif isinstance(contents, dict):
+        yield contents.get("mime_type", "")
+        yield contents.get("data", b"")
+    else:
+        yield contents if isinstance(contents, (str, bytes)) else repr(contents)
+
+
+# Bytes of prompt text (as UTF-8) and of inline media in a generate_content call
+def request_sizes(contents):
+    text_bytes = media_bytes = 0
+    for part in contents if isinstance(contents, (list, tuple)) else [contents]:
+        if isinstance(part, dict):
+            media_bytes += len(part.get("data", b""))
+        elif isinstance(part, str):
+            text_bytes += len(part.encode("utf-8"))
+    return text_bytes, media_bytes
+
+
+# The whole text of a stream another caller received, given to callers that shared it
+class _SharedChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+# The leader's stream, passed on chunk by chunk while its text is collected for the callers
+# sharing it. A stream that fails or is dropped before its end hands them an error instead.
+class _RelayedStream:
+    def __init__(self, stream, inflight, key, future):
+        self._stream = stream
+        self._inflight = inflight
+        self._key = key
+        self._future = future
+
+    def __iter__(self):
+        parts = []
+        try:
+            for chunk in self._stream:
+                parts.append(chunk.text)
+                yield chunk
+        except Exception as e:
+            self._settle(error=e)
+            raise
+        else:
+            self._settle(result="".join(parts))
+        finally:
+            # Closed part-way through by its reader
+            self._settle(error=RuntimeError("The shared response was not read to the end"))
+
+    def _settle(self, **outcome):
+        if not self._future.done():
+            self._inflight.settle(self._key, self._future, **outcome)
+
+    def __del__(self):
+        self._settle(error=RuntimeError("The shared response was not read to the end"))
+
+
+# A pooled model as seen by one session. Requests wait their turn in the API key's rate
+# limiter, run under the retry and deadline policy of their stage (see for_stage), and a
+# request identical to one already in flight shares its response.
+class ThrottledModel:
+    def __init__(self, model, throttle, session_id="", stage="default"):
+        self._model = model
+        self._throttle = throttle
+        self._session_id = session_id
+        self._stage = stage
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    # The same model with the call policy of another stage ("content", "transcription", ...)
+    def for_stage(self, stage):
+        return ThrottledModel(self._model, self._throttle, self._session_id, stage)
+
+    # timeout is what is left of the stage's deadline; the wait for the rate limiter comes out of it
+    def _send(self, contents, kwargs, timeout):
+        if self._throttle.limiter is not None:
+            queued = time.monotonic()
+            with GEMINI_QUEUE_SECONDS.labels(stage=self._stage).time():
+                self._throttle.limiter.acquire(self._session_id, timeout=min(timeout, REQUEST_QUEUE_TIMEOUT_SECONDS))
+            timeout -= time.monotonic() - queued
+            if timeout <= 0:
+                raise CallDeadlineExceeded("Model call did not start before its deadline")
+        text_bytes, media_bytes = request_sizes(contents)
+        GEMINI_BYTES.labels(stage=self._stage, part="text").inc(text_bytes)
+        GEMINI_BYTES.labels(stage=self._stage, part="media").inc(media_bytes)
+
+        started = time.monotonic()
+        try:
+            response = self._model.generate_content(contents, request_options={"timeout": timeout}, **kwargs)
+        except Exception as e:
+            GEMINI_REQUESTS.labels(stage=self._stage, outcome=type(e).__name__).inc()
+            raise
+        finally:
+            # For streams this is the time to the first chunk
+            GEMINI_REQUEST_SECONDS.labels(stage=self._stage).observe(time.monotonic() - started)
+        GEMINI_REQUESTS.labels(stage=self._stage, outcome="ok").inc()
+        # Streamed responses only report usage once consumed, so only whole responses are counted
+        usage = None if kwargs.get("stream") else getattr(response, "usage_metadata", None)
+        if usage is not None:
+            GEMINI_TOKENS.labels(stage=self._stage, direction="prompt").inc(usage.prompt_token_count)
+            GEMINI_TOKENS.labels(stage=self._stage, direction="response").inc(usage.candidates_token_count)
+        return response
+
+    def _call(self, contents, kwargs, hedge=HEDGE_REQUESTS):
+        return call_with_policy(lambda timeout: self._send(contents, kwargs, timeout), self._stage, hedge)
+
+    # With coalesce=False the request is sent even while an identical one is in flight, for
+    # generation meant to give a different answer each time (content variants)
+    def generate_content(self, contents, coalesce=True, **kwargs):
+        # A stream can only be consumed once, so streamed requests are never hedged
+        if not coalesce:
+            return self._call(contents, kwargs, hedge=not kwargs.get("stream") and HEDGE_REQUESTS)
+        options = json.dumps(kwargs, sort_keys=True, default=str)
+        key = request_fingerprint(self._model, options, *_content_parts(contents))
+        # Streamed requests share the finished text
+        if kwargs.get("stream"):
+            return self._shared_stream(key, contents, kwargs)
+        sent = []
+
+        def send():
+            sent.append(True)
+            return self._call(contents, kwargs)
+
+        response = self._throttle.inflight.run(key, send)
+        if not sent:
+            GEMINI_COALESCED.labels(stage=self._stage).inc()
+        return response
+
+    # The first caller streams from the model; identical requests made meanwhile wait for the
+    # text it received and get it as a single chunk
+    def _shared_stream(self, key, contents, kwargs):
+        inflight = self._throttle.inflight
+        future, leader = inflight.claim(key)
+        if not leader:
+            GEMINI_COALESCED.labels(stage=self._stage).inc()
+            policy = STAGE_POLICIES.get(self._stage, STAGE_POLICIES["default"])
+            try:
+                return [_SharedChunk(future.result(timeout=policy.deadline_seconds))]
+            except FutureTimeoutError:
+                raise CallDeadlineExceeded(f"Model call did not finish within {policy.deadline_seconds:g} s")
+        try:
+            stream = self._call(contents, kwargs, hedge=False)
+        except BaseException as e:
+            inflight.settle(key, future, error=e)
+            raise
+        return _RelayedStream(stream, inflight, key, future)
+
+
+
+# Get a pooled model for this API key and configuration, building it only on a miss.
+# session_id identifies the caller for fair queueing when sessions share a key.
+def get_model(api_key, model_name=MODEL_NAME, generation_config=None, safety_settings=None, session_id=""):
+    return wrap_model(_pooled_model(api_key, model_name, generation_config, safety_settings), api_key, session_id)
+
+
+# Put any backend's model behind the API key's rate limiter and the call policies
+def wrap_model(model, api_key, session_id=""):
+    return ThrottledModel(model, _throttle_for(api_key), session_id)
+
+
+def _pooled_model(api_key, model_name, generation_config, safety_settings):
+    if generation_config is None:
+        generation_config = GENERATION_CONFIG
+    if safety_settings is None:
+        safety_settings = SAFETY_SETTINGS
+
+    key = _pool_key(api_key, model_name, generation_config, safety_settings)
+
+    with _pool_lock:
+        model = _client_pool.get(key)
+        if model is not None:
+            _client_pool.move_to_end(key)
+            return model
+
+    model = MODEL_BACKENDS[GEMINI_BACKEND](api_key, model_name, generation_config, safety_settings)
+
+    with _pool_lock:
+        # Another session may have built the same client while we were configuring
+        existing = _client_pool.get(key)
+        if existing is not None:
+            _client_pool.move_to_end(key)
+            return existing
+        _client_pool[key] = model
+        while len(_client_pool) > MAX_POOLED_CLIENTS:
+            _client_pool.popitem(last=False)
+
+    return model
+
+
+# Check that an API key works by fetching the model's metadata, which costs no generation quota.
+# Keys found valid are stored in `cache` (a DiskCache) under their digest, so a returning key
+# is accepted without any request. Raises the API error for a rejected key.
+def validate_api_key(api_key, cache=None, model_name=MODEL_NAME):
+    cache_key = "api-key:" + _key_digest(api_key)
+    if cache is not None and cache.get(cache_key):
+        return
+    # The mock backend accepts any key
+    if GEMINI_BACKEND == "mock":
+        return
+
+    import google.generativeai as genai
+    from google.api_core import retry as api_retry
+    from google.generativeai import client as genai_client
+
+    with _configure_lock:
+        genai.configure(api_key=api_key)
+        model_client = genai_client.get_default_model_client()
+    # The transport's own retries are capped too, or a network problem would stall sign-in for a minute
+    check_options = {
+        "timeout": API_KEY_CHECK_TIMEOUT_SECONDS,
+        "retry": api_retry.Retry(timeout=API_KEY_CHECK_TIMEOUT_SECONDS),
+    }
+    genai.get_model(f"models/{model_name}", client=model_client, request_options=check_options)
+    if cache is not None:
+        cache.put(cache_key, True)
+
+
+# Content-addressed key for a request: model name, generation config and every prompt part
+def request_fingerprint(model, *parts):
+    digest = hashlib.sha256()
+    digest.update(model.model_name.encode("utf-8"))
+    digest.update(json.dumps(getattr(model, "_generation_config", {}), sort_keys=True, default=str).encode("utf-8"))
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
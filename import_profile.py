@@ -0,0 +1,83 @@
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+
+# Import-time profile of the app's cold start.
+#
+#   python import_profile.py --top 15 --budget-ms 800
+#
+# Runs the top-level imports of streamlit_app.py in a fresh interpreter under -X importtime,
+# prints the slowest modules, and fails if a module meant to load lazily is imported at
+# startup or the total goes over the budget.
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+# Only needed after sign-in (the Gemini SDK), on the results page (matplotlib) or once a
+# recording is processed (numpy); importing any of them at startup is a regression
+LAZY_MODULES = ["google.generativeai", "google.api_core", "numpy", "matplotlib"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the import time of the Streamlit app.")
+    parser.add_argument("--app", default=APP_PATH, help="Script whose top-level imports are profiled")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail if the imports take longer than this in total")
+    return parser.parse_args(argv)
+
+
+# The script's module-level import statements, as source to run on their own
+def top_level_imports(path):
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+# Run the imports under -X importtime; returns (module, self_us, cumulative_us, depth) rows
+def profile_imports(source, cwd):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = profile_imports(top_level_imports(args.app), os.path.dirname(os.path.abspath(args.app)))
+
+    total_ms = sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000
+    print(f"{len(rows)} modules imported in {total_ms:.0f} ms\n")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+
+    status = 0
+    loaded = {name for name, _, _, _ in rows}
+    eager = [
+        module for module in LAZY_MODULES
+        if any(name == module or name.startswith(module + ".") for name in loaded)
+    ]
+    if eager:
+        print(f"\nImported at startup but meant to load lazily: {', '.join(eager)}", file=sys.stderr)
+        status = 1
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"\nImports took {total_ms:.0f} ms, over the {args.budget_ms:g} ms budget", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
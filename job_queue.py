@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import JOBS, STAGE_SECONDS
+
+
+# Evaluations running at once across all sessions; further jobs wait in the queue
+JOB_WORKERS = int(os.environ.get("EVALUATION_WORKERS", "8"))
+# Finished jobs are kept this long so a session that reruns or reconnects can still collect them
+JOB_RETENTION_SECONDS = 3600
+
+
+# State of one background job. Only the worker thread writes it; readers just poll.
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = "queued"
+        self.stage = "queued"
+        self.message = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.details = None
+        self.created = time.time()
+        self.finished = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+
+# Process-wide worker pool for slow work started from the UI. Jobs are looked up by ID, so
+# the session that submitted one only has to remember the ID between reruns.
+class JobQueue:
+    def __init__(self, max_workers=JOB_WORKERS, retention_seconds=JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    # Run fn(*args, progress=callback, **kwargs) on a worker and return the new job's ID.
+    # The callback takes (stage, message) and updates what pollers see.
+    def submit(self, fn, *args, **kwargs):
+        job = Job(uuid.uuid4().hex)
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+        JOBS.labels(status="queued").inc()
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        JOBS.labels(status="queued").dec()
+        JOBS.labels(status="running").inc()
+        STAGE_SECONDS.labels(stage="job_queue_wait").observe(time.time() - job.created)
+
+        def progress(stage, message):
+            job.stage = stage
+            job.message = message
+
+        # The finish time is set before the status, so a job that reads as done always has one
+        try:
+            job.result = fn(*args, progress=progress, **kwargs)
+            job.finished = time.time()
+            job.status = "done"
+        except Exception as e:
+            job.error = str(e)
+            job.details = getattr(e, "details", None)
+            job.finished = time.time()
+            job.status = "failed"
+        JOBS.labels(status="running").dec()
+
+    # The job with this ID, or None once it has expired (or was never submitted here)
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished is not None and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,95 @@
+import os
+
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, start_http_server
+
+
+# Metrics the app records, kept in prometheus_client's default registry and served from a
+# local /metrics endpoint when METRICS_PORT is set.
+
+# Port of the /metrics endpoint; 0 leaves it off
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+# Address the endpoint listens on; the default keeps it private to the host
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Histogram bucket bounds in seconds, from chart rendering up to long model calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+
+
+# Every metric in the Prometheus text exposition format
+def render():
+    return generate_latest().decode("utf-8")
+
+
+# Serve the metrics on a daemon thread; returns the server
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    server, _ = start_http_server(port, addr=host)
+    return server
+
+
+# Count, mean and an upper bound on the 95th percentile (its bucket's bound) per label set
+def histogram_summary(histogram):
+    series = {}
+    for metric in histogram.collect():
+        for sample in metric.samples:
+            labels = {name: value for name, value in sample.labels.items() if name != "le"}
+            entry = series.setdefault(tuple(sorted(labels.items())), {"labels": labels, "buckets": []})
+            if sample.name.endswith("_bucket"):
+                entry["buckets"].append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_count"):
+                entry["count"] = sample.value
+            elif sample.name.endswith("_sum"):
+                entry["sum"] = sample.value
+    rows = []
+    for _, entry in sorted(series.items()):
+        count = entry.get("count", 0)
+        if not count:
+            continue
+        # Buckets are cumulative, so the first reaching 95% of the count bounds the percentile
+        p95 = next(bound for bound, cumulative in sorted(entry["buckets"]) if cumulative >= 0.95 * count)
+        rows.append({**entry["labels"], "count": int(count), "mean_seconds": round(entry["sum"] / count, 4),
+                     "p95_seconds_at_most": p95})
+    return rows
+
+
+STAGE_SECONDS = Histogram(
+    "speech_stage_seconds", "Wall time of each pipeline stage", ["stage"], buckets=DEFAULT_BUCKETS
+)
+EVALUATIONS = Counter(
+    "speech_evaluations", "Evaluations finished, by outcome (ok, cached, failed)", ["outcome"]
+)
+SINGLE_PASS_FALLBACKS = Counter(
+    "speech_single_pass_fallbacks",
+    "Single-request evaluations whose answer failed validation and were redone in two steps"
+)
+JOBS = Gauge(
+    "speech_jobs", "Background evaluation jobs by status (queued, running)", ["status"]
+)
+CACHE_LOOKUPS = Counter(
+    "speech_cache_lookups", "Cache and content bank lookups by result (hit, miss)", ["cache", "result"]
+)
+GEMINI_REQUESTS = Counter(
+    "gemini_requests", "Model call attempts by stage and outcome (ok or the error's type)", ["stage", "outcome"]
+)
+GEMINI_REQUEST_SECONDS = Histogram(
+    "gemini_request_seconds", "Duration of model call attempts", ["stage"], buckets=DEFAULT_BUCKETS
+)
+GEMINI_QUEUE_SECONDS = Histogram(
+    "gemini_queue_seconds", "Time model calls waited for the API key's rate limiter", ["stage"],
+    buckets=DEFAULT_BUCKETS
+)
+GEMINI_RETRIES = Counter(
+    "gemini_retries", "Model calls attempted again after a retryable error", ["stage"]
+)
+GEMINI_HEDGES = Counter(
+    "gemini_hedged_requests", "Second attempts sent because the first was slower than usual", ["stage"]
+)
+GEMINI_COALESCED = Counter(
+    "gemini_coalesced_requests", "Requests answered by an identical request already in flight", ["stage"]
+)
+GEMINI_BYTES = Counter(
+    "gemini_request_bytes", "Bytes sent to the model, by stage and part (text, media)", ["stage", "part"]
+)
+GEMINI_TOKENS = Counter(
+    "gemini_tokens", "Tokens reported by the model, by stage and direction (prompt, response)",
+    ["stage", "direction"]
+)
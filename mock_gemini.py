@@ -0,0 +1,205 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+
+from gemini_client import request_sizes
+from practice_content import CONTENT_PROMPTS
+from speech_evaluation import EVALUATION_INTRO_PROMPTS, REPAIR_PROMPT, TRANSCRIPTION_PROMPT
+
+
+# Local stand-in for a Gemini model, used with GEMINI_BACKEND=mock and by benchmark.py.
+# Each request is answered with a recorded response for its kind (recognised by the prompt
+# template it was built from) after a simulated latency, and a share of requests fail with
+# the errors the real service returns, so the app and benchmarks run offline.
+
+# Median seconds per request kind; latencies are log-normal around these
+LATENCY_MEDIANS = {
+    "prompt_questions": 4.0,
+    "reading_passage": 3.0,
+    "transcription": 3.0,
+    "evaluation": 8.0,
+    "repair": 3.0,
+    "default": 2.0,
+}
+# Extra seconds per MB of audio sent, for transcriptions and single-pass evaluations
+AUDIO_SECONDS_PER_MB = 1.5
+
+# Multiplies every simulated latency; benchmarks use small values to finish quickly
+MOCK_LATENCY_SCALE = float(os.environ.get("MOCK_GEMINI_LATENCY_SCALE", "1"))
+# Spread of the log-normal latency distribution (0 makes every call take the median)
+MOCK_LATENCY_SIGMA = float(os.environ.get("MOCK_GEMINI_LATENCY_SIGMA", "0.4"))
+# Share of requests failing with 503 Service Unavailable
+MOCK_ERROR_RATE = float(os.environ.get("MOCK_GEMINI_ERROR_RATE", "0"))
+# JSON file of recorded responses ({"evaluation": ["...", ...], ...}) replacing the defaults per kind
+MOCK_RESPONSES_PATH = os.environ.get("MOCK_GEMINI_RESPONSES")
+
+# Literal text every prompt of a kind starts with, up to the template's first placeholder
+_KIND_PREFIXES = [
+    (TRANSCRIPTION_PROMPT, "transcription"),
+    (EVALUATION_INTRO_PROMPTS["transcript"].text.split("$", 1)[0], "evaluation"),
+    (EVALUATION_INTRO_PROMPTS["audio"].text.split("$", 1)[0], "evaluation"),
+    (REPAIR_PROMPT.text.split("$", 1)[0], "repair"),
+    (CONTENT_PROMPTS["Prompt Questions"].text.split("$", 1)[0], "prompt_questions"),
+    (CONTENT_PROMPTS["Reading Passage"].text.split("$", 1)[0], "reading_passage"),
+]
+
+_SAMPLE_TRANSCRIPTION = (
+    "Um, I grew up in a small town near the sea. There is many fishing boats and, uh, "
+    "the people is very friendly. I think it's a good place for, for raising a family."
+)
+
+_SAMPLE_EVALUATION = {
+    "scores": {"pronunciation": 7, "vocabulary": 6, "grammar": 5, "fluency": 6, "coherence": 7},
+    "transcription_with_errors": (
+        "Um, I grew up in a small town near the sea. There "
+        "<span style='background-color: #ffdddd; border-bottom: 1px dotted red;' title='Grammar correction: are'>is</span> "
+        "many fishing boats and, uh, the people "
+        "<span style='background-color: #ffdddd; border-bottom: 1px dotted red;' title='Grammar correction: are'>is</span> "
+        "very friendly."
+    ),
+    "detailed_feedback": {
+        "pronunciation": "Clear vowels; final consonants are sometimes dropped.",
+        "vocabulary": "Everyday words used accurately; try more precise adjectives.",
+        "grammar": "Subject-verb agreement slips with plural nouns ('there is many').",
+        "fluency": "A few fillers and one repetition, otherwise a steady pace.",
+        "coherence": "Ideas follow a clear order from place to people to opinion.",
+    },
+    "strengths": ["Clear description of the setting", "Natural linking with 'and'"],
+    "improvement_recommendations": [
+        "Practise 'there are' with plural nouns",
+        "Replace 'um' with a short pause",
+        "Add one example to support your opinion",
+    ],
+    "raw_transcription": _SAMPLE_TRANSCRIPTION,
+}
+
+DEFAULT_RESPONSES = {
+    "prompt_questions": [
+        "## Discussion Questions (Read carefully and answer thoughtfully)\n"
+        "1. Where did you grow up?\n- What did you like about it?\n- Has it changed?\n\n"
+        "## Key Vocabulary (Use these words to enhance your responses)\n"
+        "- Neighbourhood: the area around your home\n- Bustling: full of activity\n\n"
+        "## Useful Expressions (Incorporate these phrases into your answers)\n"
+        "- What I love most about... : introducing a favourite detail\n\n"
+        "## Grammar Focus (Use these structures to improve your fluency)\n"
+        "- Used to + verb: I used to walk to school every day.\n"
+    ],
+    "reading_passage": [
+        "My hometown is a quiet place by the sea. Every morning the fishing boats leave the harbour "
+        "before sunrise, and by noon the market is full of people buying the day's catch."
+    ],
+    "transcription": [_SAMPLE_TRANSCRIPTION],
+    "evaluation": [json.dumps(_SAMPLE_EVALUATION)],
+    "repair": [json.dumps(_SAMPLE_EVALUATION)],
+    "default": ["OK"],
+}
+
+
+# Response and stream chunk objects only need the text attribute the app reads
+class MockResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+def _prompt_text(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    return "".join(part for part in parts if isinstance(part, str))
+
+
+# The kind of request, from the template its prompt starts with
+def request_kind(contents):
+    text = _prompt_text(contents)
+    for prefix, kind in _KIND_PREFIXES:
+        if text.startswith(prefix):
+            return kind
+    return "default"
+
+
+def load_responses(path):
+    with open(path, encoding="utf-8") as f:
+        recorded = json.load(f)
+    return {**DEFAULT_RESPONSES, **{kind: list(texts) for kind, texts in recorded.items() if texts}}
+
+
+# A model answering from recorded responses; calls are logged in .calls as
+# (kind, bytes sent, seconds, ok) for benchmarks
+class MockModel:
+    def __init__(self, model_name="mock", generation_config=None, responses=None, latency_scale=None,
+                 latency_sigma=None, error_rate=None, seed=None):
+        # Distinct from real model names, so cached results of the two never mix
+        self.model_name = f"models/mock-{model_name}"
+        self._generation_config = generation_config or {}
+        if responses is None:
+            responses = load_responses(MOCK_RESPONSES_PATH) if MOCK_RESPONSES_PATH else DEFAULT_RESPONSES
+        self.responses = responses
+        self.latency_scale = MOCK_LATENCY_SCALE if latency_scale is None else latency_scale
+        self.latency_sigma = MOCK_LATENCY_SIGMA if latency_sigma is None else latency_sigma
+        self.error_rate = MOCK_ERROR_RATE if error_rate is None else error_rate
+        self.calls = []
+        self._random = random.Random(seed)
+        self._replayed = {}
+        self._lock = threading.Lock()
+
+    def _sample(self, kind, audio_bytes):
+        with self._lock:
+            median = LATENCY_MEDIANS.get(kind, LATENCY_MEDIANS["default"]) + AUDIO_SECONDS_PER_MB * audio_bytes / 1e6
+            latency = self._random.lognormvariate(math.log(median), self.latency_sigma) * self.latency_scale
+            fails = self._random.random() < self.error_rate
+            texts = self.responses.get(kind) or self.responses["default"]
+            position = self._replayed.get(kind, 0)
+            self._replayed[kind] = position + 1
+        return latency, fails, texts[position % len(texts)]
+
+    # Evaluations asked for with a response schema get exactly the schema's fields
+    def _shape(self, text, generation_config):
+        properties = ((generation_config or {}).get("response_schema") or {}).get("properties")
+        if not properties:
+            return text
+        try:
+            answer = json.loads(text)
+        except json.JSONDecodeError:
+            return text
+        return json.dumps({key: value for key, value in answer.items() if key in properties})
+
+    def _log(self, kind, size, started, ok):
+        with self._lock:
+            self.calls.append((kind, size, time.monotonic() - started, ok))
+
+    def generate_content(self, contents, stream=False, generation_config=None, request_options=None, **kwargs):
+        from google.api_core import exceptions as api_exceptions
+
+        started = time.monotonic()
+        kind = request_kind(contents)
+        text_bytes, media_bytes = request_sizes(contents)
+        size = text_bytes + media_bytes
+        latency, fails, text = self._sample(kind, media_bytes)
+        timeout = (request_options or {}).get("timeout")
+
+        if fails:
+            # Overload errors come back quickly
+            time.sleep(min(latency * 0.1, timeout or latency))
+            self._log(kind, size, started, False)
+            raise api_exceptions.ServiceUnavailable("503 The model is overloaded (simulated)")
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            self._log(kind, size, started, False)
+            raise api_exceptions.DeadlineExceeded("504 Deadline exceeded (simulated)")
+
+        text = self._shape(text, generation_config)
+        if not stream:
+            time.sleep(latency)
+            self._log(kind, size, started, True)
+            return MockResponse(text)
+        return self._stream(kind, size, started, latency, text)
+
+    # Streams deliver the first chunk after a third of the latency and the rest evenly after it
+    def _stream(self, kind, size, started, latency, text):
+        chunks = [text[i:i + 40] for i in range(0, len(text), 40)] or [""]
+        time.sleep(latency / 3)
+        for chunk in chunks:
+            yield MockResponse(chunk)
+            time.sleep(latency * 2 / 3 / len(chunks))
+        self._log(kind, size, started, True)
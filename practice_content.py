@@ -0,0 +1,208 @@
+import re
+
+from prompt_registry import prompt_version, register
+
+
+TOPIC_OPTIONS = ["Daily Reflection", "A Recent Movie or TV Show", "My Typical Weekend",  "Grocery Shopping Habits", "A IELTS Part 2", "The Last Time I Traveled",
+                 "A Recent Conversation with a Friend", "Foods I Dislike and Why", "My Favorite Book or Movie", "A Memorable Vacation", "A Recent News Event",
+                 "My Hometown", "My Favorite Hobby", "A Memorable Birthday", "A Time I Overcame a Challenge",  "A Memorable Meal",
+                 "My Job or Studies", "A Skill That's Important in My Field"]
+
+# Speaking duration slider bounds, in minutes
+MIN_DURATION = 1
+MAX_DURATION = 10
+
+DIFFICULTY_LEVELS = ["Beginner", "Intermediate", "Advanced"]
+
+CONTENT_TYPES = ["Prompt Questions", "Reading Passage"]
+
+DIFFICULTY_FACTORS = {
+    "Beginner": {
+        "vocab_level": "simple everyday vocabulary",
+        "grammar_complexity": "basic sentence structures",
+        "passage_style": "concrete topics with simple language"
+    },
+    "Intermediate": {
+        "vocab_level": "moderate vocabulary with some idiomatic expressions",
+        "grammar_complexity": "varied sentence structures with some complex forms",
+        "passage_style": "mix of concrete and abstract topics"
+    },
+    "Advanced": {
+        "vocab_level": "advanced vocabulary with idiomatic expressions",
+        "grammar_complexity": "complex sentence structures and varied tenses",
+        "passage_style": "abstract concepts and nuanced arguments"
+    }
+}
+
+
+# Section keys in the order the model writes them, with their Markdown header titles
+SECTION_TITLES = {
+    "discussion_questions": "Discussion Questions",
+    "key_vocabulary": "Key Vocabulary",
+    "useful_expressions": "Useful Expressions",
+    "grammar_focus": "Grammar Focus"
+}
+
+SECTION_HEADER_PATTERN = re.compile(r"##\s*(" + "|".join(SECTION_TITLES.values()) + ")")
+
+
+# Patterns extracting each section, from its header up to the next section's header
+SECTION_PATTERNS = {
+    "discussion_questions": re.compile(r"##\s*Discussion Questions.*?(?=##\s*Key Vocabulary|$)", re.DOTALL),
+    "key_vocabulary": re.compile(r"##\s*Key Vocabulary.*?(?=##\s*Useful Expressions|$)", re.DOTALL),
+    "useful_expressions": re.compile(r"##\s*Useful Expressions.*?(?=##\s*Grammar Focus|$)", re.DOTALL),
+    "grammar_focus": re.compile(r"##\s*Grammar Focus.*?(?=$)", re.DOTALL)
+}
+
+
+# Function to parse the content into different sections
+def parse_content_sections(content):
+    sections = {section_key: "" for section_key in SECTION_PATTERNS}
+    
+    # Extract each section using regex
+    for section_key, pattern in SECTION_PATTERNS.items():
+        match = pattern.search(content)
+        if match:
+            sections[section_key] = match.group(0).strip()
+    
+    return sections
+
+
+# Incremental version of parse_content_sections for streamed responses.
+# A section is complete once the header of the following section arrives, or the stream ends.
+class SectionStreamParser:
+    def __init__(self):
+        self.text = ""
+        self.sections = {key: "" for key in SECTION_TITLES}
+        self._keys_by_title = {title: key for key, title in SECTION_TITLES.items()}
+        self._current = None
+        self._current_start = 0
+        self._scan_from = 0
+
+    # Add a chunk of text and return the keys of sections completed by it
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        # Only text after the last header is rescanned, which also catches headers split across chunks
+        for match in SECTION_HEADER_PATTERN.finditer(self.text, self._scan_from):
+            if self._current is not None:
+                self.sections[self._current] = self.text[self._current_start:match.start()].strip()
+                completed.append(self._current)
+            self._current = self._keys_by_title[match.group(1)]
+            self._current_start = match.start()
+            self._scan_from = match.end()
+        return completed
+
+    # Section still being received and its text so far, or (None, "") before the first header
+    def partial(self):
+        if self._current is None:
+            return None, ""
+        return self._current, self.text[self._current_start:].strip()
+
+    # Finish the stream and return the key of the last section, if any
+    def close(self):
+        if self._current is None:
+            return []
+        self.sections[self._current] = self.text[self._current_start:].strip()
+        completed = [self._current]
+        self._current = None
+        return completed
+
+
+# Prompt templates for each content type
+CONTENT_PROMPTS = {
+    "Reading Passage": register("content.reading_passage", """
+    Generate an engaging, authentic reading passage about "$topic" suitable for $duration minutes of speaking practice 
+    for an $level English learner.
+
+    The passage should:
+    - Be approximately $word_count words long
+    - Use $vocab_level
+    - Employ $grammar_complexity
+    - Focus on $passage_style
+    - Include natural dialogue if appropriate
+    - Incorporate common collocations and expressions
+    - Address real-world situations and contexts
+    - Be culturally sensitive and globally relevant
+    - Have a clear structure with introduction, body, and conclusion
+
+    For beginners: Focus on present tense, simple vocabulary, short sentences.
+    For intermediate: Mix tenses, include some idiomatic expressions, varied sentence structure.
+    For advanced: Use complex grammar, sophisticated vocabulary, nuanced concepts.
+
+    Return only the passage text without any additional instructions or notes.
+    """),
+    "Prompt Questions": register("content.prompt_questions", """
+        Generate $question_count prompt questions about "$topic" suitable for $duration minutes of speaking practice 
+        for an $level English learner.
+
+        The questions should:
+        - Progress from simpler to more complex
+        - Be open-ended to encourage detailed responses
+        - Use $vocab_level
+        - Employ $grammar_complexity
+        - Include follow-up questions to extend the conversation
+        - Cover different aspects of the topic (personal, societal, global, etc.)
+        - Encourage the learner to use specific vocabulary and grammar structures
+        - Be organized in a clear numbered list
+
+        Also include:
+        - 3-6 useful vocabulary words/phrases specifically relevant to this topic
+        - 2-5 useful expressions or sentence frames to incorporate
+        - 2-3 grammar patterns that would be natural to use when discussing this topic
+
+        Format the output as:
+
+        ## Discussion Questions (Read carefully and answer thoughtfully)
+        1. [Main question] 
+        - [Follow-up question]
+        - [Follow-up question]
+        2. [Main question]
+        - [Follow-up question]
+        - [Follow-up question]
+        ...
+
+        ## Key Vocabulary (Use these words to enhance your responses)
+        - [Term]: [Brief definition/usage example]
+        - [Term]: [Brief definition/usage example]
+        ...
+
+        ## Useful Expressions (Incorporate these phrases into your answers)
+        - [Expression]: [When/how to use it]
+        - [Expression]: [When/how to use it]
+        ...
+
+        ## Grammar Focus (Use these structures to improve your fluency)
+        - [Grammar pattern]: [Example sentence related to the topic]
+        - [Grammar pattern]: [Example sentence related to the topic]
+        ...
+        """),
+}
+
+# Fingerprint of the content templates; bank entries generated from other wording are not served
+CONTENT_PROMPT_VERSION = prompt_version("content.")
+
+# Average speaking rate used to size reading passages, in words per minute
+WORDS_PER_MINUTE = 90
+QUESTIONS_PER_MINUTE = 1
+
+
+# Build the Gemini prompt for a practice session
+def build_content_prompt(topic, duration, content_type, difficulty):
+    # Prompt Questions is the fallback for any other content type
+    template = CONTENT_PROMPTS.get(content_type, CONTENT_PROMPTS["Prompt Questions"])
+    return template.render(
+        topic=topic,
+        duration=duration,
+        level=difficulty.lower(),
+        word_count=int(duration * WORDS_PER_MINUTE),
+        question_count=int(duration * QUESTIONS_PER_MINUTE),
+        **DIFFICULTY_FACTORS[difficulty]
+    )
+
+
+# Turn the raw model text into what the app displays: sections for questions, plain text for passages
+def format_content(content, content_type):
+    if content_type == "Prompt Questions":
+        return parse_content_sections(content)
+    return content
@@ -0,0 +1,96 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from content_bank import CONTENT_BANK_PATH, ContentBank
+from gemini_client import get_model
+from practice_content import (
+    CONTENT_TYPES,
+    DIFFICULTY_LEVELS,
+    MAX_DURATION,
+    MIN_DURATION,
+    TOPIC_OPTIONS,
+    build_content_prompt,
+    format_content,
+)
+
+
+# Pre-generate practice content for every topic/duration/difficulty combination.
+#
+#   python prewarm_content.py --workers 4
+#
+# Entries already in the bank are skipped, so an interrupted run can simply be restarted.
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-generate the practice content bank.")
+    parser.add_argument("--bank", default=CONTENT_BANK_PATH, help="Path of the content bank file")
+    parser.add_argument("--api-key", default=os.environ.get("API_KEY"), help="Gemini API key (defaults to $API_KEY)")
+    parser.add_argument("--workers", type=int, default=4, help="Maximum number of concurrent Gemini requests")
+    parser.add_argument("--variants", type=int, default=1, help="Number of variants to keep per combination")
+    parser.add_argument("--topics", nargs="+", default=TOPIC_OPTIONS, help="Topics to generate (default: all)")
+    parser.add_argument("--durations", nargs="+", type=int, default=list(range(MIN_DURATION, MAX_DURATION + 1)),
+                        help="Durations in minutes (default: all)")
+    parser.add_argument("--difficulties", nargs="+", choices=DIFFICULTY_LEVELS, default=DIFFICULTY_LEVELS,
+                        help="Difficulty levels (default: all)")
+    parser.add_argument("--content-types", nargs="+", choices=CONTENT_TYPES, default=["Prompt Questions"],
+                        help="Content types (default: Prompt Questions)")
+    return parser.parse_args(argv)
+
+
+def generate_entry(model, topic, duration, content_type, difficulty):
+    prompt = build_content_prompt(topic, duration, content_type, difficulty)
+    # Variants of one combination are generated concurrently and must not share one answer
+    response = model.for_stage("content").generate_content(prompt, coalesce=False)
+    return format_content(response.text, content_type)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.api_key:
+        print("A Gemini API key is required (--api-key or $API_KEY).", file=sys.stderr)
+        return 2
+
+    bank = ContentBank(args.bank)
+    model = get_model(args.api_key)
+
+    # One job per missing variant, so partially built combinations are topped up
+    jobs = []
+    for topic in args.topics:
+        for duration in args.durations:
+            for difficulty in args.difficulties:
+                for content_type in args.content_types:
+                    missing = args.variants - bank.count(topic, duration, difficulty, content_type)
+                    jobs.extend([(topic, duration, content_type, difficulty)] * max(missing, 0))
+
+    total = len(jobs)
+    if bank.stale:
+        print(f"Ignoring {bank.stale} entries generated from an older version of the content prompts")
+    print(f"{len(bank)} entries already in {args.bank}; generating {total} more with {args.workers} workers")
+    if not total:
+        return 0
+
+    failures = 0
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(generate_entry, model, *job): job for job in jobs}
+        for done, future in enumerate(as_completed(futures), start=1):
+            topic, duration, content_type, difficulty = futures[future]
+            label = f"{topic} / {duration} min / {difficulty} / {content_type}"
+            try:
+                content = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{total}] FAILED {label}: {e}", file=sys.stderr)
+                continue
+            bank.add(topic, duration, difficulty, content_type, content)
+            print(f"[{done}/{total}] {label} ({time.time() - started:.0f}s elapsed)")
+
+    print(f"Done: {total - failures} generated, {failures} failed, {len(bank)} entries in the bank")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from disk_cache import CACHE_DIR, init_sqlite, sqlite_connection
+from speech_evaluation import SCORE_KEYS
+
+
+# Every finished evaluation of each learner (scores, settings and measured fluency) in SQLite,
+# for the progress view. Per-day sums and each evaluation's moving averages are computed when
+# it is recorded, so reading trends touches a bounded number of indexed rows however long the
+# history grows.
+
+PROGRESS_HISTORY_PATH = os.environ.get("PROGRESS_HISTORY_PATH", os.path.join(CACHE_DIR, "history.sqlite3"))
+# Secret the learner ids are keyed with; when unset, a random one is created in the cache directory
+LEARNER_ID_KEY = os.environ.get("LEARNER_ID_KEY")
+LEARNER_ID_KEY_PATH = os.path.join(CACHE_DIR, "learner_id.key")
+# Evaluations averaged together for the moving averages
+MOVING_AVERAGE_WINDOW = 5
+
+# Measured fluency values kept from the acoustic features
+FLUENCY_KEYS = ["speech_rate", "articulation_rate", "mean_length_of_run", "pauses_per_minute"]
+_AVERAGED = SCORE_KEYS + ["overall"]
+
+
+_learner_key = None
+
+
+# The server-side key, read from the environment or the key file. The first process to need it
+# creates the file exclusively, so app processes sharing the cache directory agree on one key.
+def _learner_id_key():
+    global _learner_key
+    if _learner_key is None:
+        if LEARNER_ID_KEY:
+            _learner_key = LEARNER_ID_KEY.encode("utf-8")
+        else:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            try:
+                fd = os.open(LEARNER_ID_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                # Another process may still be writing it
+                for _ in range(50):
+                    with open(LEARNER_ID_KEY_PATH) as f:
+                        key = f.read().strip()
+                    if key:
+                        break
+                    time.sleep(0.1)
+                else:
+                    raise RuntimeError(f"The learner id key file {LEARNER_ID_KEY_PATH} is empty")
+            else:
+                key = secrets.token_hex(32)
+                with os.fdopen(fd, "w") as f:
+                    f.write(key)
+            _learner_key = key.encode("utf-8")
+    return _learner_key
+
+
+# Learners are identified by the API key or password they sign in with, stored only as an HMAC
+# under a server-side key, so the history file alone can't be used to guess a password offline;
+# everyone sharing a password shares one history
+def learner_id(secret):
+    return hmac.new(_learner_id_key(), secret.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+
+class ProgressHistory:
+    def __init__(self, path=PROGRESS_HISTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        init_sqlite(
+            path,
+            f"""
+            CREATE TABLE IF NOT EXISTS evaluations (
+                id INTEGER PRIMARY KEY,
+                learner TEXT NOT NULL,
+                created REAL NOT NULL,
+                recording TEXT,
+                topic TEXT NOT NULL,
+                duration INTEGER NOT NULL,
+                difficulty TEXT NOT NULL,
+                {", ".join(f"{key} REAL NOT NULL" for key in _AVERAGED)},
+                {", ".join(f"{key} REAL" for key in FLUENCY_KEYS)},
+                {", ".join(f"average_{key} REAL NOT NULL" for key in _AVERAGED)}
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS evaluations_learner_created ON evaluations (learner, created)",
+            f"""
+            CREATE TABLE IF NOT EXISTS daily_scores (
+                learner TEXT NOT NULL,
+                day TEXT NOT NULL,
+                evaluations INTEGER NOT NULL,
+                {", ".join(f"sum_{key} REAL NOT NULL" for key in _AVERAGED)},
+                measured INTEGER NOT NULL,
+                {", ".join(f"sum_{key} REAL NOT NULL" for key in FLUENCY_KEYS)},
+                PRIMARY KEY (learner, day)
+            )
+            """,
+        )
+        with self._connect() as conn:
+            # Histories created before recordings were tracked gain the column
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(evaluations)")}
+            if "recording" not in columns:
+                conn.execute("ALTER TABLE evaluations ADD COLUMN recording TEXT")
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS evaluations_learner_recording ON evaluations (learner, recording)"
+            )
+
+    # Rows are read by column name
+    def _connect(self):
+        return sqlite_connection(self.path, row_factory=sqlite3.Row)
+
+    # Add a finished evaluation, updating its day's sums and the moving averages in the same transaction.
+    # A recording (its fingerprint) is counted once per learner, so evaluations served again from the
+    # cache don't skew the trends; returns whether the evaluation was added.
+    def record(self, learner, evaluation, topic, duration, difficulty, recording=None, created=None):
+        created = time.time() if created is None else created
+        scores = {key: float(evaluation["scores"][key]) for key in SCORE_KEYS}
+        scores["overall"] = round(sum(scores.values()) / len(SCORE_KEYS), 2)
+        features = evaluation.get("acoustic_features") or {}
+        fluency = {key: features.get(key) for key in FLUENCY_KEYS}
+        measured = all(value is not None for value in fluency.values())
+        day = time.strftime("%Y-%m-%d", time.localtime(created))
+
+        with self._lock, self._connect() as conn:
+            # Taken before reading the previous rows, so concurrent writers can't average the same window
+            conn.execute("BEGIN IMMEDIATE")
+            previous = conn.execute(
+                f"SELECT {', '.join(_AVERAGED)} FROM evaluations WHERE learner = ? AND created <= ? "
+                "ORDER BY created DESC LIMIT ?",
+                (learner, created, MOVING_AVERAGE_WINDOW - 1)
+            ).fetchall()
+            averages = {
+                key: round((scores[key] + sum(row[key] for row in previous)) / (len(previous) + 1), 2)
+                for key in _AVERAGED
+            }
+            columns = ["learner", "created", "recording", "topic", "duration", "difficulty", *_AVERAGED, *FLUENCY_KEYS,
+                       *(f"average_{key}" for key in _AVERAGED)]
+            values = [learner, created, recording, topic, duration, difficulty, *(scores[key] for key in _AVERAGED),
+                      *(fluency.values()), *(averages[key] for key in _AVERAGED)]
+            inserted = conn.execute(
+                f"INSERT OR IGNORE INTO evaluations ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                values
+            ).rowcount
+            if not inserted:
+                return False
+
+            sums = [f"sum_{key}" for key in _AVERAGED + FLUENCY_KEYS]
+            conn.execute(
+                f"""INSERT INTO daily_scores (learner, day, evaluations, measured, {', '.join(sums)})
+                    VALUES (?, ?, 1, ?, {', '.join('?' * len(sums))})
+                    ON CONFLICT (learner, day) DO UPDATE SET
+                    evaluations = evaluations + 1, measured = measured + excluded.measured,
+                    {', '.join(f'{column} = {column} + excluded.{column}' for column in sums)}""",
+                [learner, day, int(measured), *(scores[key] for key in _AVERAGED),
+                 *((fluency[key] if measured else 0.0) for key in FLUENCY_KEYS)]
+            )
+        return True
+
+    # Mean of each day's evaluations over the last `days` days, oldest first
+    def daily_trend(self, learner, days=90):
+        since = time.strftime("%Y-%m-%d", time.localtime(time.time() - days * 86400))
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM daily_scores WHERE learner = ? AND day >= ? ORDER BY day", (learner, since)
+            ).fetchall()
+        return [_day_means(row) for row in rows]
+
+    # Evaluation count and mean scores over the whole history, from the per-day sums
+    def summary(self, learner):
+        sums = [f"sum_{key}" for key in _AVERAGED + FLUENCY_KEYS]
+        with self._connect() as conn:
+            row = conn.execute(
+                f"""SELECT COALESCE(SUM(evaluations), 0) AS evaluations, COALESCE(SUM(measured), 0) AS measured,
+                    MIN(day) AS first_day, MAX(day) AS last_day, {', '.join(f'SUM({column}) AS {column}' for column in sums)}
+                    FROM daily_scores WHERE learner = ?""",
+                (learner,)
+            ).fetchone()
+        if not row["evaluations"]:
+            return {"evaluations": 0}
+        return {**_day_means(row), "first_day": row["first_day"], "last_day": row["last_day"]}
+
+    # The latest evaluations with their moving averages, oldest first
+    def recent(self, learner, limit=50):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM evaluations WHERE learner = ? ORDER BY created DESC LIMIT ?", (learner, limit)
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+
+def _day_means(row):
+    means = {"evaluations": row["evaluations"]}
+    if "day" in row.keys():
+        means["day"] = row["day"]
+    for key in _AVERAGED:
+        means[key] = round(row[f"sum_{key}"] / row["evaluations"], 2)
+    for key in FLUENCY_KEYS:
+        means[key] = round(row[f"sum_{key}"] / row["measured"], 2) if row["measured"] else None
+    return means
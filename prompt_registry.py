@@ -0,0 +1,73 @@
+import hashlib
+import json
+import re
+
+
+# Prompt templates, registered once at import by the modules that own them. A template is
+# split into literal text and $placeholders when registered, so rendering is a join rather
+# than a formatting pass. Braces are plain text, which keeps JSON examples readable.
+
+_PLACEHOLDER_PATTERN = re.compile(r"\$(\w+)")
+
+
+# One named template with a version that changes whenever its wording does
+class PromptTemplate:
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+        self.version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        pieces = _PLACEHOLDER_PATTERN.split(text)
+        # Literal text and placeholder names alternate, starting and ending with literal text
+        self._literals = pieces[0::2]
+        self.fields = pieces[1::2]
+
+    # Substitute the placeholders; values are inserted as they are, never rescanned
+    def render(self, **values):
+        parts = [self._literals[0]]
+        for field, literal in zip(self.fields, self._literals[1:]):
+            parts.append(str(values[field]))
+            parts.append(literal)
+        return "".join(parts)
+
+
+_templates = {}
+
+
+# Add a template under a dotted name ("evaluation.rubric"); registering the same name twice
+# with different text is a mistake and raises
+def register(name, text):
+    existing = _templates.get(name)
+    if existing is not None and existing.text != text:
+        raise ValueError(f"Prompt template {name!r} is already registered with different text")
+    template = existing or PromptTemplate(name, text)
+    _templates[name] = template
+    return template
+
+
+# Register data that shapes requests without being prompt text (response schemas, example
+# shapes), so changing it changes prompt_version like a template edit would
+def register_data(name, value):
+    return register(name, json.dumps(value, sort_keys=True))
+
+
+def get_template(name):
+    return _templates[name]
+
+
+def render(name, **values):
+    return _templates[name].render(**values)
+
+
+# Version of every template whose name starts with one of the prefixes, for cache keys of
+# responses to prompts built from them
+def prompt_version(*prefixes):
+    names = sorted(name for name in _templates if name.startswith(prefixes))
+    if not names:
+        raise KeyError(f"No prompt templates match {prefixes!r}")
+    combined = "\n".join(f"{name}:{_templates[name].version}" for name in names)
+    return hashlib.sha256(combined.encode("utf-8")).hexdigest()[:16]
+
+
+# Name -> version of every registered template
+def template_versions():
+    return {name: template.version for name, template in sorted(_templates.items())}
@@ -0,0 +1,100 @@
+import html
+import io
+import math
+from functools import lru_cache
+
+
+# Rendered charts kept per (categories, scores); results pages rerun often with the same scores
+RADAR_CACHE_SIZE = 256
+
+CHART_COLOR = "#2563EB"
+MAX_SCORE = 10
+RING_SCORES = [2, 4, 6, 8, 10]
+
+
+# Radar chart of scores out of 10 as a self-contained SVG string, drawn with plain geometry
+# (no matplotlib). Axes start at 3 o'clock and run counterclockwise, like a polar plot.
+@lru_cache(maxsize=RADAR_CACHE_SIZE)
+def radar_chart_svg(categories, scores, size=300):
+    # Extra width on both sides leaves room for labels on the left and right axes
+    width = size + 120
+    center_x = width / 2
+    center = size / 2
+    radius = size * 0.32
+
+    def point(index, value):
+        angle = 2 * math.pi * index / len(categories)
+        distance = radius * value / MAX_SCORE
+        return center_x + distance * math.cos(angle), center - distance * math.sin(angle)
+
+    def points(values):
+        # Out-of-range scores are drawn at the edge of the chart
+        clamped = (max(0, min(value, MAX_SCORE)) for value in values)
+        return " ".join(f"{x:.1f},{y:.1f}" for x, y in (point(i, value) for i, value in enumerate(clamped)))
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {size}" width="100%" '
+        f'style="max-width:{width}px" font-family="sans-serif" role="img" aria-label="Speech Evaluation Scores">',
+        f'<text x="{center_x}" y="16" text-anchor="middle" font-size="12">Speech Evaluation Scores</text>',
+    ]
+    for ring in RING_SCORES:
+        parts.append(
+            f'<polygon points="{points([ring] * len(categories))}" fill="none" stroke="grey" '
+            f'stroke-width="0.6" stroke-dasharray="3,3" opacity="0.5"/>'
+        )
+        x, y = point(0, ring)
+        parts.append(f'<text x="{x + 2:.1f}" y="{y - 2:.1f}" font-size="7" fill="grey">{ring}</text>')
+    for index, category in enumerate(categories):
+        x, y = point(index, MAX_SCORE)
+        parts.append(
+            f'<line x1="{center_x}" y1="{center}" x2="{x:.1f}" y2="{y:.1f}" stroke="grey" '
+            f'stroke-width="0.6" stroke-dasharray="3,3" opacity="0.5"/>'
+        )
+        label_x, label_y = point(index, MAX_SCORE * 1.18)
+        cos = math.cos(2 * math.pi * index / len(categories))
+        anchor = "middle" if abs(cos) < 0.3 else ("start" if cos > 0 else "end")
+        parts.append(
+            f'<text x="{label_x:.1f}" y="{label_y + 4:.1f}" text-anchor="{anchor}" font-size="11">'
+            f'{html.escape(str(category))}</text>'
+        )
+    parts.append(
+        f'<polygon points="{points(scores)}" fill="{CHART_COLOR}" fill-opacity="0.25" '
+        f'stroke="{CHART_COLOR}" stroke-width="2"/>'
+    )
+    for index, score in enumerate(scores):
+        x, y = point(index, max(0, min(score, MAX_SCORE)))
+        parts.append(f'<circle cx="{x:.1f}" cy="{y:.1f}" r="3" fill="{CHART_COLOR}"/>')
+    parts.append("</svg>")
+    # One line, so Markdown rendering can't mistake indented parts for a code block
+    return "".join(parts)
+
+
+# The same chart rendered by matplotlib as PNG bytes. The figure is built without pyplot, so
+# it never enters pyplot's global registry, and is cleared once saved.
+@lru_cache(maxsize=RADAR_CACHE_SIZE)
+def radar_chart_png(categories, scores):
+    import numpy as np
+    from matplotlib.figure import Figure
+
+    # Compute angle for each category and close the outline
+    angles = np.linspace(0, 2 * np.pi, len(categories), endpoint=False)
+    closed_angles = np.concatenate((angles, [angles[0]]))
+    closed_scores = np.concatenate((scores, [scores[0]]))
+
+    fig = Figure(figsize=(3, 3))
+    ax = fig.add_subplot(polar=True)
+    ax.plot(closed_angles, closed_scores, 'o-', linewidth=2, color=CHART_COLOR)
+    ax.fill(closed_angles, closed_scores, alpha=0.25, color=CHART_COLOR)
+    ax.set_thetagrids(np.degrees(angles), categories)
+    ax.set_ylim(0, MAX_SCORE)
+    ax.set_rlabel_position(0)
+    ax.set_rticks(RING_SCORES)
+    ax.set_yticklabels([str(ring) for ring in RING_SCORES], color='grey', fontsize=1.5)
+    ax.set_title('Speech Evaluation Scores', fontsize=5, pad=3)
+    ax.grid(True, color='grey', linestyle='--', linewidth=0.3, alpha=0.5)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", dpi=200)
+    fig.clear()
+    return buffer.getvalue()
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+
+
+# Raised when a request waited longer than allowed for its turn
+class RateLimitTimeout(TimeoutError):
+    pass
+
+
+# Token bucket shared by many callers, handing out tokens round-robin across sessions:
+# a session with many queued requests can't starve one that has a single request waiting.
+class FairRateLimiter:
+    def __init__(self, rate_per_second, burst):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        # Session -> queue of waiting tickets; the first session is served next
+        self._waiting = OrderedDict()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def _remove(self, session, ticket):
+        queue = self._waiting[session]
+        queue.remove(ticket)
+        if queue:
+            # Served sessions go to the back of the rotation
+            self._waiting.move_to_end(session)
+        else:
+            del self._waiting[session]
+
+    # Number of callers waiting for a token
+    def waiting(self):
+        with self._condition:
+            return sum(len(queue) for queue in self._waiting.values())
+
+    # Block until this session's turn comes and a token is available
+    def acquire(self, session="", timeout=None):
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._waiting.setdefault(session, deque()).append(ticket)
+            try:
+                while True:
+                    self._refill()
+                    my_turn = next(iter(self._waiting.values()))[0] is ticket
+                    if my_turn and self._tokens >= 1:
+                        self._tokens -= 1
+                        self._remove(session, ticket)
+                        self._condition.notify_all()
+                        return
+                    # The caller whose turn it is sleeps until the next token is due; the others
+                    # sleep until it is served and wakes them
+                    wait = (1 - self._tokens) / self.rate_per_second if my_turn else None
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise RateLimitTimeout("Timed out waiting for a rate limit slot")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._condition.wait(wait)
+            except BaseException:
+                if ticket in self._waiting.get(session, ()):
+                    self._remove(session, ticket)
+                    self._condition.notify_all()
+                raise
+
+
+# Identical requests made while one is already running wait for its result instead of
+# being sent again; the result (or exception) is shared by every caller.
+class InflightRequests:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    # Number of distinct requests running
+    def __len__(self):
+        with self._lock:
+            return len(self._calls)
+
+    # The future shared by callers of key, and whether this caller is the one to settle it
+    def claim(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    # Hand the leader's result (or exception) to everyone waiting on key; later callers start afresh
+    def settle(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key, fn):
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.settle(key, future, error=e)
+            raise
+        self.settle(key, future, result=result)
+        return result
@@ -0,0 +1,92 @@
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+from disk_cache import CACHE_DIR, init_sqlite, sqlite_connection
+
+
+# Practice state of each browser session (content, recording fingerprint, running job and
+# evaluation results) in SQLite, keyed by a token kept in the page URL. A refresh, reconnect
+# or server restart loads it back, as does any app server sharing the file.
+
+# Sessions untouched for this long are deleted
+SESSION_TTL_HOURS = float(os.environ.get("SESSION_TTL_HOURS", "72"))
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", os.path.join(CACHE_DIR, "sessions.sqlite3"))
+
+_TOKEN_PATTERN = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def new_session_token():
+    return secrets.token_urlsafe(18)
+
+
+# Tokens come from the URL, so anything that doesn't look like one we issued is ignored
+def is_session_token(value):
+    return isinstance(value, str) and bool(_TOKEN_PATTERN.match(value))
+
+
+# One row per session field, so saving a field rewrites only that field's value
+class SessionStore:
+    def __init__(self, path=SESSION_STORE_PATH, ttl_seconds=SESSION_TTL_HOURS * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        init_sqlite(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                token TEXT PRIMARY KEY,
+                updated REAL NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS session_fields (
+                token TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (token, field)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)",
+        )
+
+    def _expire(self, conn, now):
+        cutoff = now - self.ttl_seconds
+        conn.execute(
+            "DELETE FROM session_fields WHERE token IN (SELECT token FROM sessions WHERE updated < ?)", (cutoff,)
+        )
+        conn.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+    # Every saved field of a session, or {} for an unknown or expired token
+    def load(self, token):
+        now = time.time()
+        with self._lock, sqlite_connection(self.path) as conn:
+            self._expire(conn, now)
+            rows = conn.execute("SELECT field, value FROM session_fields WHERE token = ?", (token,)).fetchall()
+            if rows:
+                conn.execute("UPDATE sessions SET updated = ? WHERE token = ?", (now, token))
+        return {field: json.loads(value) for field, value in rows}
+
+    # Store the given fields; a field saved as None is removed
+    def save(self, token, **fields):
+        now = time.time()
+        with self._lock, sqlite_connection(self.path) as conn:
+            self._expire(conn, now)
+            conn.execute("INSERT OR REPLACE INTO sessions (token, updated) VALUES (?, ?)", (token, now))
+            for field, value in fields.items():
+                if value is None:
+                    conn.execute("DELETE FROM session_fields WHERE token = ? AND field = ?", (token, field))
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO session_fields (token, field, value) VALUES (?, ?, ?)",
+                        (token, field, json.dumps(value))
+                    )
+
+    def clear(self, token):
+        with self._lock, sqlite_connection(self.path) as conn:
+            conn.execute("DELETE FROM session_fields WHERE token = ?", (token,))
+            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
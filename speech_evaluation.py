@@ -0,0 +1,501 @@
+import html
+import json
+import re
+
+from prompt_registry import prompt_version, register, register_data
+
+
+TRANSCRIPTION_PROMPT = register("evaluation.transcription", """
+        Please provide a verbatim transcription of the speech in this audio file.
+        Transcribe exactly what you hear including any filler words, repetitions, 
+        or grammatical errors. Do not correct mistakes. Only output the raw transcription.
+        """).text
+
+SCORE_KEYS = ["pronunciation", "vocabulary", "grammar", "fluency", "coherence"]
+
+# JSON schema pieces for structured output
+def _object_schema(properties):
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+_TEXT_LIST_SCHEMA = {"type": "array", "items": {"type": "string"}}
+FIELD_SCHEMAS = {
+    "scores": _object_schema({key: {"type": "integer"} for key in SCORE_KEYS}),
+    "transcription_with_errors": {"type": "string"},
+    "detailed_feedback": _object_schema({key: {"type": "string"} for key in SCORE_KEYS}),
+    "strengths": _TEXT_LIST_SCHEMA,
+    "improvement_recommendations": _TEXT_LIST_SCHEMA,
+    "raw_transcription": {"type": "string"},
+}
+
+
+# Generation config overrides that make the model answer with exactly these fields as JSON
+def structured_output_config(fields):
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": _object_schema({field: FIELD_SCHEMAS[field] for field in fields}),
+    }
+
+
+# Fields of a complete evaluation, with the shape asked for when one has to be re-requested
+EVALUATION_FIELDS = {
+    "scores": '{"pronunciation": 7, "vocabulary": 6, "grammar": 8, "fluency": 7, "coherence": 6}',
+    "transcription_with_errors": '"The marked up transcription with HTML spans"',
+    "detailed_feedback": '{"pronunciation": "...", "vocabulary": "...", "grammar": "...", "fluency": "...", "coherence": "..."}',
+    "strengths": '["Strength with specific example"]',
+    "improvement_recommendations": '["Specific recommendation"]',
+}
+
+
+# Longest run of words compared when removing text repeated across overlapping chunks
+MAX_OVERLAP_WORDS = 30
+
+
+def _comparable_words(words):
+    return [re.sub(r"[^\w']", "", word.lower()) for word in words]
+
+
+# Join chunk transcripts in order. Where a chunk overlaps the previous one, the words
+# transcribed twice are dropped, allowing for a cut-off word on either side of the seam.
+def stitch_transcripts(parts, overlaps_previous):
+    words = []
+    for part, overlapped in zip(parts, overlaps_previous):
+        part_words = part.split()
+        if overlapped and words:
+            tail = _comparable_words(words[-(MAX_OVERLAP_WORDS + 2):])
+            head = _comparable_words(part_words[:MAX_OVERLAP_WORDS + 2])
+            match = None
+            for size in range(min(MAX_OVERLAP_WORDS, len(tail), len(head)), 1, -1):
+                for tail_skip in range(3):
+                    for head_skip in range(3):
+                        tail_end = len(tail) - tail_skip
+                        if tail_end - size < 0 or head_skip + size > len(head):
+                            continue
+                        if tail[tail_end - size:tail_end] == head[head_skip:head_skip + size]:
+                            match = (tail_skip, head_skip + size)
+                            break
+                    if match:
+                        break
+                if match:
+                    break
+            if match:
+                tail_skip, head_start = match
+                words = words[:len(words) - tail_skip]
+                part_words = part_words[head_start:]
+        words.extend(part_words)
+    return " ".join(words)
+
+
+# Measured pause statistics, so the model can use them as fluency evidence
+PAUSE_STATS_PROMPT = register("evaluation.pause_stats", """
+        Measured timing of the original recording (use this as objective evidence for fluency;
+        long silences were shortened in the audio you received):
+        - Speaking time: $speech_seconds s of $recorded_seconds s recorded
+        - Pauses of $min_pause s or longer: $pause_count (mean $mean_pause s, longest $longest_pause s)
+        - Pauses of $long_pause s or longer: $long_pause_count
+        """)
+
+# Measured fluency and prosody features, one line per measure; the pitch line is left out
+# when no pitch could be tracked
+ACOUSTIC_FEATURES_PROMPT = register("evaluation.acoustic_features", """
+        Measured acoustics of the original recording (objective evidence for fluency and intonation;$note
+        syllables are estimated from loudness peaks, so treat counts as approximate):
+        - Speaking time: $speaking_seconds s of $duration_seconds s recorded
+        - Speech rate: $speech_rate syllables/min overall, $articulation_rate while speaking
+        - Mean length of run: $mean_length_of_run syllables between pauses
+        - Pauses of $min_pause s or longer: $pause_count (median $pause_median s, 90th percentile $pause_p90 s)$pitch
+        - Loudness variation while speaking: $energy_variation dB
+        """)
+ACOUSTIC_PITCH_LINE = register("evaluation.acoustic_features_pitch", """
+        - Pitch: median $pitch_median Hz, range $pitch_range semitones, variation $pitch_variation semitones""")
+
+
+# Describe measured pause statistics so the model can use them as fluency evidence
+def format_pause_stats(pause_stats):
+    if not pause_stats:
+        return ""
+    # Imported here: audio_processing loads numpy, which prompt text alone doesn't need
+    from audio_processing import LONG_PAUSE_SECONDS, MIN_PAUSE_SECONDS
+
+    return PAUSE_STATS_PROMPT.render(
+        speech_seconds=f"{pause_stats['speech_seconds']:.1f}",
+        recorded_seconds=f"{pause_stats['recorded_seconds']:.1f}",
+        min_pause=MIN_PAUSE_SECONDS,
+        pause_count=pause_stats["pause_count"],
+        mean_pause=f"{pause_stats['mean_pause_seconds']:.1f}",
+        longest_pause=f"{pause_stats['longest_pause_seconds']:.1f}",
+        long_pause=f"{LONG_PAUSE_SECONDS:g}",
+        long_pause_count=pause_stats["long_pause_count"],
+    )
+
+
+# Describe the measured fluency and prosody features; covers the pause statistics too,
+# so the prompt carries one compact block of numbers instead of two
+def format_acoustic_features(features, pause_stats=None):
+    if not features:
+        return format_pause_stats(pause_stats)
+    from audio_processing import MIN_PAUSE_SECONDS
+
+    pitch = ""
+    if features["pitch_variation_semitones"] is not None:
+        pitch = ACOUSTIC_PITCH_LINE.render(
+            pitch_median=f"{features['pitch_median_hz']:.0f}",
+            pitch_range=f"{features['pitch_range_semitones']:.1f}",
+            pitch_variation=f"{features['pitch_variation_semitones']:.1f}",
+        )
+    return ACOUSTIC_FEATURES_PROMPT.render(
+        note=" long silences were shortened in the audio you received;" if pause_stats else "",
+        speaking_seconds=f"{features['speaking_seconds']:.1f}",
+        duration_seconds=f"{features['duration_seconds']:.1f}",
+        speech_rate=f"{features['speech_rate']:.0f}",
+        articulation_rate=f"{features['articulation_rate']:.0f}",
+        mean_length_of_run=f"{features['mean_length_of_run']:.1f}",
+        min_pause=MIN_PAUSE_SECONDS,
+        pause_count=features["pause_count"],
+        pause_median=f"{features['pause_median_seconds']:.1f}",
+        pause_p90=f"{features['pause_p90_seconds']:.1f}",
+        pitch=pitch,
+        energy_variation=f"{features['energy_variation_db']:.1f}",
+    )
+
+
+# Evaluation prompt templates: an introduction to the speech, the measured acoustics, the
+# scoring rubric and the output format
+EVALUATION_INTRO_PROMPTS = {
+    "transcript": register("evaluation.intro_transcript", """
+        Act as an English speech pathologist and evaluate this transcribed speech. 
+        The speaker is an $level level English learner who spoke about "$topic" for approximately $duration minutes.
+        
+        Transcription: "$transcription"
+        """),
+    "audio": register("evaluation.intro_audio", """
+        Act as an English speech pathologist and evaluate the speech in this audio file.
+        The speaker is an $level level English learner who spoke about "$topic" for approximately $duration minutes.
+        
+        First transcribe the audio verbatim, exactly as spoken, including any filler words, repetitions,
+        or grammatical errors. Do not correct mistakes. Score pronunciation from what you hear in the audio.
+        """),
+}
+
+EVALUATION_RUBRIC_PROMPT = register("evaluation.rubric", """
+        Evaluate the following criteria on a scale of 1-10:
+        1. Pronunciation (10-point scale):
+           - Accuracy of phonemes (individual sounds)
+           - Word stress placement
+           - Sentence intonation patterns
+           - Specific sound challenges (th, r, l, etc.)
+           - Rhythm and connected speech
+        
+        2. Vocabulary (10-point scale):
+           - Range and variety of words used
+           - Appropriateness for the topic
+           - Use of advanced/precise vocabulary vs. basic terms
+           - Collocations and idiomatic expressions
+           - Word choice accuracy
+        
+        3. Grammar (10-point scale):
+           - Verb tense consistency and accuracy
+           - Subject-verb agreement
+           - Article usage (a/an/the)
+           - Preposition usage
+           - Sentence structure complexity and correctness
+        
+        4. Fluency (10-point scale):
+           - Speech rate (too slow/fast?)
+           - Hesitations and fillers (um, uh, like)
+           - Pausing patterns (natural vs. unnatural)
+           - Flow between ideas
+           - Self-corrections and repetitions
+        
+        5. Coherence & Cohesion (10-point scale):
+           - Logical organization of ideas
+           - Use of discourse markers and transitions
+           - Topic development and relevance
+           - Clear beginning, middle, and conclusion
+           - Connective devices between sentences
+        
+        For each criterion:
+        - Provide a numerical score (1-10)
+        - Provide 2-3 specific examples from the transcription that justify your score
+        - Identify patterns (not just isolated errors)
+        - Give 1-2 specific, actionable improvement suggestions tailored to the speaker's level
+        - For intermediate/advanced learners, suggest not just corrections but enhancements
+        
+        Mark errors in the transcription using simple HTML:
+        - Grammar errors: "<span style='background-color: #ffdddd; border-bottom: 1px dotted red;' title='Grammar correction: [correct form]'>[incorrect text]</span>"
+        - Vocabulary errors: "<span style='background-color: #ffe6cc; border-bottom: 1px dotted orange;' title='Better word choice: [better word]'>[original word]</span>"
+        - Usage errors: "<span style='background-color: #e6f2ff; border-bottom: 1px dotted blue;' title='Natural expression: [natural expression]'>[unnatural expression]</span>"        
+        
+        Additionally, identify 0-3 strengths the speaker demonstrated, to provide balanced feedback.
+        """)
+
+# With structured output the response schema fixes the shape, so only field meanings are described
+EVALUATION_FORMAT_PROMPTS = {
+    "structured": register("evaluation.format_structured", """
+        Fill in every field of the response: scores (one per criterion), transcription_with_errors
+        (the transcription with HTML markup for errors), detailed_feedback (by category), strengths,
+        improvement_recommendations (3 friendly, encouraging suggestions)$transcription_note.
+        """),
+    "json": register("evaluation.format_json", """
+        Format your response as JSON with these sections:
+        1. scores (numerical values for each criterion)
+        2. transcription_with_errors (original text with HTML markup for errors)
+        3. detailed_feedback (detailed feedback by category)
+        4. improvement_recommendations (3 friendly, encouraging suggestions)$transcription_section
+        
+        The JSON structure should look like:
+        {
+            "scores": {
+                "pronunciation": 7,
+                "vocabulary": 6,
+                "grammar": 8,
+                "fluency": 7,
+                "coherence": 6
+            },
+            "transcription_with_errors": "The marked up transcription with HTML spans",
+            "detailed_feedback": {
+                "pronunciation": "Detailed analysis...",
+                "vocabulary": "Detailed analysis...",
+                "grammar": "Detailed analysis...",
+                "fluency": "Detailed analysis...",
+                "coherence": "Detailed analysis..."
+            },
+            "strengths": [
+                "Strength 1 with specific example",
+                "Strength 2 with specific example",
+                "Strength 3 with specific example"
+            ],
+            "improvement_recommendations": [
+                "Specific recommendation 1",
+                "Specific recommendation 2"
+            ]$transcription_field
+        }
+        Your response MUST be in valid JSON format with:
+        1. All property names in double quotes (not single quotes)
+        2. All string values in double quotes (not single quotes)
+        3. No trailing commas
+        4. No JavaScript-style comments
+        Ensure your response is valid JSON and can be parsed with json.loads(). DO NOT include any text outside the JSON object.
+        """),
+}
+
+# Extra output field asked for when the model transcribes the audio itself
+_RAW_TRANSCRIPTION_NOTE = ", raw_transcription (the verbatim transcription, without any markup)"
+_RAW_TRANSCRIPTION_SECTION = "\n        5. raw_transcription (the verbatim transcription, without any markup)"
+_RAW_TRANSCRIPTION_FIELD = ',\n            "raw_transcription": "The verbatim transcription"'
+
+
+# Build the evaluation prompt. Without a transcription the model gets the audio itself,
+# transcribes it and returns the verbatim text in a raw_transcription field.
+# With structured=True the JSON shape comes from structured_output_config instead of the prompt.
+def build_evaluation_prompt(topic, duration, difficulty, transcription=None, pause_stats=None, features=None,
+                            structured=False):
+    with_audio = transcription is None
+    speech_intro = EVALUATION_INTRO_PROMPTS["audio" if with_audio else "transcript"].render(
+        level=difficulty.lower(), topic=topic, duration=duration, transcription=transcription
+    )
+    output_format = EVALUATION_FORMAT_PROMPTS["structured" if structured else "json"].render(
+        transcription_note=_RAW_TRANSCRIPTION_NOTE if with_audio else "",
+        transcription_section=_RAW_TRANSCRIPTION_SECTION if with_audio else "",
+        transcription_field=_RAW_TRANSCRIPTION_FIELD if with_audio else "",
+    )
+    return speech_intro + format_acoustic_features(features, pause_stats) + EVALUATION_RUBRIC_PROMPT.text + output_format
+
+
+# The response schemas and the field shapes quoted in repair prompts shape requests as much
+# as the wording does, so they count towards the version too
+register_data("evaluation.field_schemas", FIELD_SCHEMAS)
+register_data("evaluation.field_shapes", EVALUATION_FIELDS)
+
+# Fingerprint of the evaluation prompt templates, measurement blocks and response schemas; it
+# changes whenever any of them does, so results cached under older ones are never served again
+PROMPT_VERSION = prompt_version("evaluation.")
+
+
+_JSON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _drop_trailing_comma(out):
+    index = len(out) - 1
+    while index >= 0 and out[index].isspace():
+        index -= 1
+    if index >= 0 and out[index] == ",":
+        del out[index]
+
+
+# Cut the outermost JSON object out of a model answer and repair the defects models commonly
+# produce: surrounding prose or fences, comments, trailing commas, Python literals and an
+# answer cut off mid-object. String contents are copied untouched.
+# Raises json.JSONDecodeError when nothing parseable is left.
+def extract_json_object(text):
+    start = text.find("{")
+    if start < 0:
+        raise json.JSONDecodeError("No JSON object found", text, 0)
+
+    out = []
+    closers = []
+    # Output length and open containers after each comma, for cutting back a truncated answer
+    checkpoints = []
+    in_string = False
+    index = start
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            if char == "\\" and index + 1 < len(text):
+                out.append(text[index:index + 2])
+                index += 2
+                continue
+            out.append(char)
+            in_string = char != '"'
+        elif char == '"':
+            out.append(char)
+            in_string = True
+        elif char in "{[":
+            out.append(char)
+            closers.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            out.append(closers.pop())
+            if not closers:
+                break
+        elif char == ",":
+            checkpoints.append((len(out), list(closers)))
+            out.append(char)
+        elif text.startswith("//", index):
+            end = text.find("\n", index)
+            index = len(text) if end < 0 else end
+            continue
+        elif text.startswith("/*", index):
+            end = text.find("*/", index + 2)
+            index = len(text) if end < 0 else end + 2
+            continue
+        elif char.isalpha():
+            word = re.match(r"\w+", text[index:]).group()
+            out.append(_JSON_LITERALS.get(word, word))
+            index += len(word)
+            continue
+        else:
+            out.append(char)
+        index += 1
+
+    if not closers:
+        candidates = [(out, [])]
+    else:
+        # Truncated: close what is still open, or failing that cut back to an earlier member.
+        # A string cut off mid-way is dropped rather than kept incomplete.
+        candidates = [] if in_string else [(out, closers)]
+        candidates.extend((out[:length], open_closers) for length, open_closers in reversed(checkpoints))
+    error = json.JSONDecodeError("Incomplete JSON object", text, start)
+    for body, open_closers in candidates:
+        body = list(body)
+        _drop_trailing_comma(body)
+        try:
+            return json.loads("".join(body + open_closers[::-1]), strict=False)
+        except json.JSONDecodeError:
+            continue
+    raise error
+
+
+# Bring near-miss values into the expected shape: scores given as "7" or "7/10", score and
+# feedback keys in another case, single strings where a list is expected
+def normalize_evaluation(evaluation_results):
+    for field in ["scores", "detailed_feedback"]:
+        values = evaluation_results.get(field)
+        if not isinstance(values, dict):
+            continue
+        normalized = {}
+        for key, value in values.items():
+            key = key.strip().lower()
+            key = next((score_key for score_key in SCORE_KEYS if key.startswith(score_key)), key)
+            if field == "scores" and isinstance(value, str):
+                match = re.match(r"\s*(\d+(?:\.\d+)?)", value)
+                value = float(match.group(1)) if match else value
+            if field == "scores" and isinstance(value, float) and value.is_integer():
+                value = int(value)
+            normalized[key] = value
+        evaluation_results[field] = normalized
+    for field in ["strengths", "improvement_recommendations"]:
+        if isinstance(evaluation_results.get(field), str):
+            evaluation_results[field] = [evaluation_results[field]]
+    if isinstance(evaluation_results.get("transcription_with_errors"), str):
+        evaluation_results["transcription_with_errors"] = html.unescape(evaluation_results["transcription_with_errors"])
+    return evaluation_results
+
+
+# Parse the model's JSON answer; raises json.JSONDecodeError when no JSON object can be recovered
+def parse_evaluation_response(text):
+    try:
+        evaluation_results = json.loads(text.strip(), strict=False)
+    except json.JSONDecodeError:
+        evaluation_results = extract_json_object(text)
+    if not isinstance(evaluation_results, dict):
+        raise json.JSONDecodeError("Expected a JSON object", text, 0)
+    return normalize_evaluation(evaluation_results)
+
+
+# Top-level fields that are missing or malformed, in the order the results page uses them
+def evaluation_problems(evaluation_results, require_transcription=False):
+    if not isinstance(evaluation_results, dict):
+        return list(EVALUATION_FIELDS)
+    problems = []
+    scores = evaluation_results.get("scores")
+    if not isinstance(scores, dict) or any(
+        isinstance(scores.get(key), bool) or not isinstance(scores.get(key), (int, float))
+        for key in SCORE_KEYS
+    ):
+        problems.append("scores")
+    if not isinstance(evaluation_results.get("transcription_with_errors"), str):
+        problems.append("transcription_with_errors")
+    feedback = evaluation_results.get("detailed_feedback")
+    if not isinstance(feedback, dict) or any(not isinstance(feedback.get(key), str) for key in SCORE_KEYS):
+        problems.append("detailed_feedback")
+    for key in ["strengths", "improvement_recommendations"]:
+        if not isinstance(evaluation_results.get(key), list):
+            problems.append(key)
+    if require_transcription:
+        raw_transcription = evaluation_results.get("raw_transcription")
+        if not isinstance(raw_transcription, str) or not raw_transcription.strip():
+            problems.append("raw_transcription")
+    return problems
+
+
+REPAIR_PROMPT = register("evaluation.repair", """
+        Act as an English speech pathologist. You are completing the evaluation of an English learner
+        at the $level level who spoke about "$topic" for approximately $duration minutes.
+
+        Transcription: "$transcription"
+
+        The evaluation so far:
+        $evaluation_so_far
+
+        Write only the missing fields ($fields), scoring each criterion 1-10 where scores
+        are requested and marking errors in the transcription with the same HTML spans as before.
+        """)
+REPAIR_JSON_PROMPT = register("evaluation.repair_json", """
+        Respond with a JSON object containing exactly these keys and nothing else:
+        {
+            $shape
+        }
+        """)
+
+
+# Ask only for the fields an evaluation is missing; the valid part is included so the
+# new fields stay consistent with it
+def build_repair_prompt(evaluation_results, fields, topic, duration, difficulty, transcription, structured=False):
+    valid_part = {key: value for key, value in evaluation_results.items() if key in EVALUATION_FIELDS and key not in fields}
+    prompt = REPAIR_PROMPT.render(
+        level=difficulty.lower(), topic=topic, duration=duration, transcription=transcription,
+        evaluation_so_far=json.dumps(valid_part, ensure_ascii=False), fields=", ".join(fields)
+    )
+    if structured:
+        return prompt
+    shape = ",\n            ".join(f'"{field}": {EVALUATION_FIELDS[field]}' for field in fields)
+    return prompt + REPAIR_JSON_PROMPT.render(shape=shape)
+
+
+# Fill in the requested fields from a repair answer
+def merge_evaluation(evaluation_results, repair, fields):
+    for field in fields:
+        if field in repair:
+            evaluation_results[field] = repair[field]
+    return evaluation_results
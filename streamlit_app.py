@@ -1,19 +1,25 @@
 import streamlit as st
-import json
 import os
-import numpy as np
-import matplotlib.pyplot as plt
 import time
 from datetime import timedelta
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
-import tempfile
 import base64
-from matplotlib.path import Path
-import matplotlib.patches as patches
-import html
+import hashlib
 import streamlit.components.v1 as components
-import re  # Add this for regex pattern matching
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import sys
+from gemini_client import API_KEY_CACHE_TTL_HOURS, get_model, request_fingerprint, validate_api_key
+from disk_cache import DiskCache, CACHE_DIR
+from content_bank import ContentBank
+from practice_content import (
+    TOPIC_OPTIONS, DIFFICULTY_LEVELS, MIN_DURATION, MAX_DURATION, SECTION_TITLES,
+    SectionStreamParser, build_content_prompt, format_content
+)
+from evaluation_pipeline import STAGES, evaluate_recording, open_evaluation_cache
+from job_queue import JobQueue
+import metrics
+from progress_history import MOVING_AVERAGE_WINDOW, ProgressHistory, learner_id
+from radar_chart import radar_chart_png, radar_chart_svg
+from session_store import SessionStore, is_session_token, new_session_token
 
 
 # Configure the page
@@ -110,32 +116,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Function to parse the content into different sections
-def parse_content_sections(content):
-    sections = {
-        "discussion_questions": "",
-        "key_vocabulary": "",
-        "useful_expressions": "",
-        "grammar_focus": ""
-    }
-    
-    # Define regex patterns to extract each section
-    patterns = {
-        "discussion_questions": r"##\s*Discussion Questions.*?(?=##\s*Key Vocabulary|$)",
-        "key_vocabulary": r"##\s*Key Vocabulary.*?(?=##\s*Useful Expressions|$)",
-        "useful_expressions": r"##\s*Useful Expressions.*?(?=##\s*Grammar Focus|$)",
-        "grammar_focus": r"##\s*Grammar Focus.*?(?=$)"
-    }
-    
-    # Extract each section using regex
-    for section_key, pattern in patterns.items():
-        match = re.search(pattern, content, re.DOTALL)
-        if match:
-            sections[section_key] = match.group(0).strip()
-    
-    return sections
-
-
 # Initialize session state
 if 'recording' not in st.session_state:
     st.session_state.recording = False
@@ -149,38 +129,130 @@ if 'content' not in st.session_state:
     st.session_state.content = None
 if 'api_key_entered' not in st.session_state:
     st.session_state.api_key_entered = False
+if 'evaluation_job' not in st.session_state:
+    st.session_state.evaluation_job = None
+if 'evaluation_error' not in st.session_state:
+    st.session_state.evaluation_error = None
+if 'learner' not in st.session_state:
+    st.session_state.learner = None
+
+# Whether the fast evaluation checkbox starts ticked; a failed single request falls back to two steps
+SINGLE_PASS_EVALUATION = os.environ.get("SINGLE_PASS_EVALUATION", "0") == "1"
+# "svg" draws the score chart as inline SVG; "matplotlib" renders it as a PNG image
+RADAR_CHART_RENDERER = os.environ.get("RADAR_CHART_RENDERER", "svg")
+# How often a page with a running evaluation checks on it
+EVALUATION_POLL_SECONDS = 1.0
+# An evaluation running elsewhere whose saved progress is older than this is taken as lost
+EVALUATION_STALE_SECONDS = 600
+# Show stage timings and the raw metrics at the bottom of every page
+SHOW_DEBUG_PANEL = os.environ.get("SHOW_DEBUG_PANEL", "0") == "1"
 
 # Define the password
 CORRECT_PASSWORD1 = os.environ['PASSWORD1']
 CORRECT_PASSWORD2 = os.environ['PASSWORD2']
 DEFAULT_API_KEY = os.environ['API_KEY']
 
+# Generated practice content cache settings
+CONTENT_CACHE_TTL_HOURS = float(os.environ.get("CONTENT_CACHE_TTL_HOURS", "168"))
+CONTENT_CACHE_MAX_MB = float(os.environ.get("CONTENT_CACHE_MAX_MB", "50"))
+# Serve up to this many cached variants per prompt round-robin so learners still get variety
+CONTENT_CACHE_VARIANTS = int(os.environ.get("CONTENT_CACHE_VARIANTS", "1"))
+
+# One on-disk content cache shared by every session in this process
+@st.cache_resource
+def get_content_cache():
+    return DiskCache(
+        os.path.join(CACHE_DIR, "content.sqlite3"),
+        ttl_seconds=CONTENT_CACHE_TTL_HOURS * 3600,
+        max_bytes=int(CONTENT_CACHE_MAX_MB * 1024 * 1024)
+    )
+
+# Finished evaluations keyed by recording and settings, shared with batch_evaluate.py
+@st.cache_resource
+def get_evaluation_cache():
+    return open_evaluation_cache()
+
+# Digests of API keys that passed validation, so returning users sign in without a request
+@st.cache_resource
+def get_api_key_cache():
+    return DiskCache(os.path.join(CACHE_DIR, "api_keys.sqlite3"), ttl_seconds=API_KEY_CACHE_TTL_HOURS * 3600)
+
+# Pre-generated content bank, loaded once per process at startup
+@st.cache_resource
+def get_content_bank():
+    return ContentBank()
+
+# Serve the Prometheus metrics of this process once, if METRICS_PORT is set
+@st.cache_resource
+def start_metrics_endpoint():
+    if not metrics.METRICS_PORT:
+        return None
+    try:
+        return metrics.start_metrics_server()
+    except OSError as e:
+        # Another app process on this host already serves the port
+        print(f"Metrics endpoint not started on port {metrics.METRICS_PORT}: {e}", file=sys.stderr)
+        return None
+
+start_metrics_endpoint()
+
+# Saved practice state of every session, shared with other app processes using the same directory
+@st.cache_resource
+def get_session_store():
+    return SessionStore()
+
+# Session state fields saved to the session store
+PERSISTED_FIELDS = [
+    "content", "topic", "duration", "difficulty", "audio_name", "audio_fingerprint",
+    "evaluation_job", "evaluation_results", "evaluation_error"
+]
+
+# Point this browser session at a saved state; the token lives in the URL so a refresh keeps it
+def use_session_token(token):
+    st.session_state.session_token = token
+    st.query_params["session"] = token
+
+# A new, empty session owned by whoever is signed in
+def start_new_session():
+    use_session_token(new_session_token())
+    save_session(owner=st.session_state.learner)
+
+# Load the saved practice state once per connection, after sign-in. A token in the URL only
+# brings back a session started under the same sign-in; anyone else gets a fresh one.
+def restore_session():
+    if "session_token" in st.session_state:
+        return
+    token = st.query_params.get("session")
+    saved = get_session_store().load(token) if is_session_token(token) else {}
+    if not saved.get("owner") or saved["owner"] != st.session_state.learner:
+        start_new_session()
+        return
+    use_session_token(token)
+    for field in PERSISTED_FIELDS:
+        if field in saved:
+            st.session_state[field] = saved[field]
+    st.session_state.evaluated = bool(saved.get("evaluation_results"))
+    # A job that finished before its ID was saved has nothing left to poll
+    if saved.get("evaluation_results") or saved.get("evaluation_error"):
+        st.session_state.evaluation_job = None
+
+def save_session(**fields):
+    get_session_store().save(st.session_state.session_token, **fields)
+
+# Scores of every evaluation, kept for the progress view after Start Over
+@st.cache_resource
+def get_progress_history():
+    return ProgressHistory()
+
+# Sessions sharing an API key are served in turn by its rate limiter
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx else ""
+
 # Gemini API Configuration
 def setup_gemini(api_key):
-    genai.configure(api_key=api_key)
-    
-    # Set up the model
-    generation_config = {
-        "temperature": 0.5,
-        "top_p": 1,
-        "top_k": 32,
-        "max_output_tokens": 8192,
-    }
-    
-    safety_settings = {
-        HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-    
-    model = genai.GenerativeModel(
-        model_name="gemini-2.0-flash",
-        generation_config=generation_config,
-        safety_settings=safety_settings
-    )
-    
-    return model
+    # Models are pooled per API key and config, so reruns reuse the same client
+    return get_model(api_key, session_id=current_session_id())
 
 # Function to record audio directly in the browser
 def record_audio():
@@ -246,359 +318,143 @@ def record_audio():
     <button id="recordButton" class="record-button">Start Recording</button>
     """, unsafe_allow_html=True)
 
-# Create radar chart function
-def create_radar_chart(categories, scores):
-    # Convert to numpy array
-    scores = np.array(scores)
-    
-    # Number of variables
-    N = len(categories)
-    
-    # Compute angle for each category
-    angles = np.linspace(0, 2*np.pi, N, endpoint=False).tolist()
-    
-    # Make the plot circular
-    scores = np.concatenate((scores, [scores[0]]))
-    angles = np.concatenate((angles, [angles[0]]))
-    categories = np.concatenate((categories, [categories[0]]))
-    
-    # Create the plot
-    fig, ax = plt.subplots(figsize=(3, 3), subplot_kw=dict(polar=True))
-    
-    # Draw the outline of the data
-    ax.plot(angles, scores, 'o-', linewidth=2, color='#2563EB')
-    
-    # Fill the area
-    ax.fill(angles, scores, alpha=0.25, color='#2563EB')
-    
-    # Set the labels
-    ax.set_thetagrids(np.degrees(angles[:-1]), categories[:-1])
-    
-    # Set y-axis limits
-    ax.set_ylim(0, 10)
-    
-    # Set the tick labels
-    ax.set_rlabel_position(0)
-    ax.set_rticks([2, 4, 6, 8, 10])
-    ax.set_yticklabels(['2', '4', '6', '8', '10'], color='grey', fontsize=1.5)
-    
-    # Add a title
-    ax.set_title('Speech Evaluation Scores', fontsize=5, pad=3)
+# Stream practice questions from the model, filling each tab as soon as its section is complete
+def stream_content_sections(model, prompt, coalesce=True):
+    placeholder = st.empty()
+    with placeholder.container():
+        tabs = st.tabs(list(SECTION_TITLES.values()))
+        slots = {}
+        for section_key, tab in zip(SECTION_TITLES, tabs):
+            with tab:
+                slots[section_key] = st.empty()
+                slots[section_key].markdown("_Generating..._")
     
-    # Customize the grid
-    ax.grid(True, color='grey', linestyle='--', linewidth=0.3, alpha=0.5)
+    parser = SectionStreamParser()
+    for chunk in model.for_stage("content").generate_content(prompt, stream=True, coalesce=coalesce):
+        for section_key in parser.feed(chunk.text):
+            slots[section_key].markdown(parser.sections[section_key], unsafe_allow_html=True)
+        # Show the section in progress as it arrives
+        section_key, partial_text = parser.partial()
+        if section_key is not None:
+            slots[section_key].markdown(partial_text, unsafe_allow_html=True)
+    parser.close()
     
-    # Customize the plot
-    plt.tight_layout()
-    
-    return fig
+    # The finished content is rendered by the regular display code
+    placeholder.empty()
+    return parser.text
 
 # Generate content function
-def generate_content(model, topic, duration, content_type, difficulty):
+def generate_content(model, topic, duration, content_type, difficulty, stream=False):
     try:
-        # Calculate content length based on duration
-        words_per_minute = 90  # Average speaking rate
-        words_for_passage = int(duration * words_per_minute)
-        questions_per_minute = 1
-        question_count = int(duration * questions_per_minute)
-        
-        # Adjust for difficulty
-        difficulty_factors = {
-            "Beginner": {
-                "vocab_level": "simple everyday vocabulary",
-                "grammar_complexity": "basic sentence structures",
-                "passage_style": "concrete topics with simple language"
-            },
-            "Intermediate": {
-                "vocab_level": "moderate vocabulary with some idiomatic expressions",
-                "grammar_complexity": "varied sentence structures with some complex forms",
-                "passage_style": "mix of concrete and abstract topics"
-            },
-            "Advanced": {
-                "vocab_level": "advanced vocabulary with idiomatic expressions",
-                "grammar_complexity": "complex sentence structures and varied tenses",
-                "passage_style": "abstract concepts and nuanced arguments"
-            }
-        }
-        
-        difficulty_settings = difficulty_factors[difficulty]
-        
-          
-        if content_type == "Reading Passage":
-            prompt = f"""
-        Generate an engaging, authentic reading passage about "{topic}" suitable for {duration} minutes of speaking practice 
-        for an {difficulty.lower()} English learner.
-        
-        The passage should:
-        - Be approximately {words_for_passage} words long
-        - Use {difficulty_settings['vocab_level']}
-        - Employ {difficulty_settings['grammar_complexity']}
-        - Focus on {difficulty_settings['passage_style']}
-        - Include natural dialogue if appropriate
-        - Incorporate common collocations and expressions
-        - Address real-world situations and contexts
-        - Be culturally sensitive and globally relevant
-        - Have a clear structure with introduction, body, and conclusion
-        
-        For beginners: Focus on present tense, simple vocabulary, short sentences.
-        For intermediate: Mix tenses, include some idiomatic expressions, varied sentence structure.
-        For advanced: Use complex grammar, sophisticated vocabulary, nuanced concepts.
-        
-        Return only the passage text without any additional instructions or notes.
-        """
-            
-        else:  # Prompt Questions
-            prompt = f"""
-            Generate {question_count} prompt questions about "{topic}" suitable for {duration} minutes of speaking practice 
-            for an {difficulty.lower()} English learner.
-            
-            The questions should:
-            - Progress from simpler to more complex
-            - Be open-ended to encourage detailed responses
-            - Use {difficulty_settings['vocab_level']}
-            - Employ {difficulty_settings['grammar_complexity']}
-            - Include follow-up questions to extend the conversation
-            - Cover different aspects of the topic (personal, societal, global, etc.)
-            - Encourage the learner to use specific vocabulary and grammar structures
-            - Be organized in a clear numbered list
-            
-            Also include:
-            - 3-6 useful vocabulary words/phrases specifically relevant to this topic
-            - 2-5 useful expressions or sentence frames to incorporate
-            - 2-3 grammar patterns that would be natural to use when discussing this topic
-            
-            Format the output as:
-            
-            ## Discussion Questions (Read carefully and answer thoughtfully)
-            1. [Main question] 
-            - [Follow-up question]
-            - [Follow-up question]
-            2. [Main question]
-            - [Follow-up question]
-            - [Follow-up question]
-            ...
-            
-            ## Key Vocabulary (Use these words to enhance your responses)
-            - [Term]: [Brief definition/usage example]
-            - [Term]: [Brief definition/usage example]
-            ...
-            
-            ## Useful Expressions (Incorporate these phrases into your answers)
-            - [Expression]: [When/how to use it]
-            - [Expression]: [When/how to use it]
-            ...
-            
-            ## Grammar Focus (Use these structures to improve your fluency)
-            - [Grammar pattern]: [Example sentence related to the topic]
-            - [Grammar pattern]: [Example sentence related to the topic]
-            ...
-            """
+        # Pre-generated content from the bank needs no API call at all
+        content = get_content_bank().get(topic, duration, difficulty, content_type)
+        if content is not None:
+            return content
         
-        # Call Gemini API
-        response = model.generate_content(prompt)
-        content = response.text
+        prompt = build_content_prompt(topic, duration, content_type, difficulty)
+        
+        # Serve from the content cache when this exact prompt was generated before
+        content_cache = get_content_cache()
+        cache_key = request_fingerprint(model, prompt)
+        content = content_cache.get(cache_key, CONTENT_CACHE_VARIANTS)
+        if content is None:
+            # Sessions missing the same content share one request, unless several variants are kept
+            coalesce = CONTENT_CACHE_VARIANTS == 1
+            with metrics.STAGE_SECONDS.labels(stage="content_generation").time():
+                if stream and content_type == "Prompt Questions":
+                    content = stream_content_sections(model, prompt, coalesce)
+                else:
+                    # Call Gemini API
+                    response = model.for_stage("content").generate_content(prompt, coalesce=coalesce)
+                    content = response.text
+            content_cache.put(cache_key, content, CONTENT_CACHE_VARIANTS)
         
         # Parse the content into sections if it's "Prompt Questions"
-        if content_type == "Prompt Questions":
-            sections = parse_content_sections(content)
-            return sections
-        else:
-            return content
-    except Exception as e:
-        st.error(f"Error generating content: {str(e)}")
-        return None
-        
+        return format_content(content, content_type)
     except Exception as e:
         st.error(f"Error generating content: {str(e)}")
         return None
 
-# Function to transcribe audio
-def transcribe_audio(model, audio_file):
+# Background evaluation jobs shared by every session in this process
+@st.cache_resource
+def get_job_queue():
+    return JobQueue()
+
+# Runs on the job worker and saves progress and the outcome under the session's token, so the
+# result is kept even if the page that started it was refreshed or reconnected to another server
+def evaluate_for_session(store, history, token, learner, recording, model, audio_file, topic, duration, difficulty, progress, **kwargs):
+    def report(stage, message):
+        progress(stage, message)
+        store.save(token, evaluation_progress=[stage, message, time.time()])
+
     try:
-        # Create a temporary file to process the audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp:
-            audio_path = tmp.name
-            # Write the uploaded file to the temporary file
-            if isinstance(audio_file, str):  # Simulated audio for demo
-                # Just a placeholder for demo purposes
-                with open(audio_path, 'wb') as f:
-                    f.write(b'dummy audio data')
-            else:
-                # Real uploaded file
-                audio_file.seek(0)
-                with open(audio_path, 'wb') as f:
-                    f.write(audio_file.read())
-        
-        # Read the audio file as bytes
-        with open(audio_path, 'rb') as f:
-            audio_data = f.read()
-        
-        # Prepare transcription prompt
-        transcription_prompt = """
-        Please provide a verbatim transcription of the speech in this audio file.
-        Transcribe exactly what you hear including any filler words, repetitions, 
-        or grammatical errors. Do not correct mistakes. Only output the raw transcription.
-        """
-        
-        # Call Gemini API with the audio file
-        response = model.generate_content([
-            transcription_prompt,
-            {"mime_type": "audio/wav", "data": audio_data}
-        ])
-        
-        transcription = response.text.strip()
-        
-        # Clean up the temporary file if needed
-        if hasattr(audio_file, 'read'):
-            os.unlink(audio_path)
-            
-        return transcription
+        result = evaluate_recording(model, audio_file, topic, duration, difficulty, progress=report, **kwargs)
     except Exception as e:
-        st.error(f"Error transcribing audio: {str(e)}")
-        return None
+        store.save(token, evaluation_job=None, evaluation_progress=None,
+                   evaluation_error=[str(e), getattr(e, "details", None)])
+        raise
+    store.save(token, evaluation_job=None, evaluation_progress=None, evaluation_results=result)
+    if learner:
+        history.record(learner, result, topic, duration, difficulty, recording=recording)
+    return result
 
-# Evaluate speech function
-def evaluate_speech(model, audio_file, topic, duration, difficulty):
-    try:
-        # Get transcription from the actual audio file using Gemini API
-        with st.spinner("Transcribing your audio..."):
-            transcription = transcribe_audio(model, audio_file)
-        
-        if not transcription:
-            st.error("Failed to transcribe audio. Please try again.")
-            return None
-            
-        st.success("Audio transcribed successfully!")
-        
-        # Prepare evaluation prompt with the actual transcription
-        evaluation_prompt = f"""
-        Act as an English speech pathologist and evaluate this transcribed speech. 
-        The speaker is an {difficulty.lower()} level English learner who spoke about "{topic}" for approximately {duration} minutes.
-        
-        Transcription: "{transcription}"
-        
-        Evaluate the following criteria on a scale of 1-10:
-        1. Pronunciation (10-point scale):
-           - Accuracy of phonemes (individual sounds)
-           - Word stress placement
-           - Sentence intonation patterns
-           - Specific sound challenges (th, r, l, etc.)
-           - Rhythm and connected speech
-        
-        2. Vocabulary (10-point scale):
-           - Range and variety of words used
-           - Appropriateness for the topic
-           - Use of advanced/precise vocabulary vs. basic terms
-           - Collocations and idiomatic expressions
-           - Word choice accuracy
-        
-        3. Grammar (10-point scale):
-           - Verb tense consistency and accuracy
-           - Subject-verb agreement
-           - Article usage (a/an/the)
-           - Preposition usage
-           - Sentence structure complexity and correctness
-        
-        4. Fluency (10-point scale):
-           - Speech rate (too slow/fast?)
-           - Hesitations and fillers (um, uh, like)
-           - Pausing patterns (natural vs. unnatural)
-           - Flow between ideas
-           - Self-corrections and repetitions
-        
-        5. Coherence & Cohesion (10-point scale):
-           - Logical organization of ideas
-           - Use of discourse markers and transitions
-           - Topic development and relevance
-           - Clear beginning, middle, and conclusion
-           - Connective devices between sentences
-        
-        For each criterion:
-        - Provide a numerical score (1-10)
-        - Provide 2-3 specific examples from the transcription that justify your score
-        - Identify patterns (not just isolated errors)
-        - Give 1-2 specific, actionable improvement suggestions tailored to the speaker's level
-        - For intermediate/advanced learners, suggest not just corrections but enhancements
-        
-        Mark errors in the transcription using simple HTML:
-        - Grammar errors: "<span style='background-color: #ffdddd; border-bottom: 1px dotted red;' title='Grammar correction: [correct form]'>[incorrect text]</span>"
-        - Vocabulary errors: "<span style='background-color: #ffe6cc; border-bottom: 1px dotted orange;' title='Better word choice: [better word]'>[original word]</span>"
-        - Usage errors: "<span style='background-color: #e6f2ff; border-bottom: 1px dotted blue;' title='Natural expression: [natural expression]'>[unnatural expression]</span>"        
-        
-        Additionally, identify 0-3 strengths the speaker demonstrated, to provide balanced feedback.
+# Start evaluating in the background; the page polls the job instead of waiting on Gemini
+def submit_evaluation(model, audio_file, topic, duration, difficulty, single_pass=False):
+    store = get_session_store()
+    token = st.session_state.session_token
+    st.session_state.evaluation_error = None
+    store.save(token, evaluation_error=None, evaluation_results=None,
+               evaluation_progress=["queued", "Waiting for a free worker...", time.time()])
+    st.session_state.evaluation_job = get_job_queue().submit(
+        evaluate_for_session, store, get_progress_history(), token, st.session_state.learner,
+        st.session_state.get("audio_fingerprint"),
+        model, audio_file, topic, duration, difficulty,
+        single_pass=single_pass, cache=get_evaluation_cache()
+    )
+    save_session(evaluation_job=st.session_state.evaluation_job)
 
-        Format your response as JSON with these sections:
-        1. scores (numerical values for each criterion)
-        2. transcription_with_errors (original text with HTML markup for errors)
-        3. detailed_feedback (detailed feedback by category)
-        4. improvement_recommendations (3 friendly, encouraging suggestions)
-        
-        The JSON structure should look like:
-        {{
-            "scores": {{
-                "pronunciation": 7,
-                "vocabulary": 6,
-                "grammar": 8,
-                "fluency": 7,
-                "coherence": 6
-            }},
-            "transcription_with_errors": "The marked up transcription with HTML spans",
-            "detailed_feedback": {{
-                "pronunciation": "Detailed analysis...",
-                "vocabulary": "Detailed analysis...",
-                "grammar": "Detailed analysis...",
-                "fluency": "Detailed analysis...",
-                "coherence": "Detailed analysis..."
-            }},
-            "strengths": [
-                "Strength 1 with specific example",
-                "Strength 2 with specific example",
-                "Strength 3 with specific example"
-            ],
-            "improvement_recommendations": [
-                "Specific recommendation 1",
-                "Specific recommendation 2"
-            ]
-        }}
-        Your response MUST be in valid JSON format with:
-        1. All property names in double quotes (not single quotes)
-        2. All string values in double quotes (not single quotes)
-        3. No trailing commas
-        4. No JavaScript-style comments
-        Ensure your response is valid JSON and can be parsed with json.loads(). DO NOT include any text outside the JSON object.
-        """
-        
-        # Call Gemini API for evaluation
-        with st.spinner("Evaluating your speech..."):
-            response = model.generate_content(evaluation_prompt)
-            
-            # Try to parse the JSON response
-            try:
-                # Clean the response text to ensure it's valid JSON
-                clean_response = response.text.strip()
-                # If the response is wrapped in backticks (code block), remove them
-                if clean_response.startswith("```json") and clean_response.endswith("```"):
-                    clean_response = clean_response[7:-3].strip()
-                elif clean_response.startswith("```") and clean_response.endswith("```"):
-                    clean_response = clean_response[3:-3].strip()
-                
-                evaluation_results = json.loads(clean_response)
-                if 'transcription_with_errors' in evaluation_results:
-                    evaluation_results['transcription_with_errors'] = html.unescape(evaluation_results['transcription_with_errors'])
-                
-                # Store the raw transcription too
-                evaluation_results["raw_transcription"] = transcription
-                
-            except json.JSONDecodeError as e:
-                st.error(f"Failed to parse the AI response as JSON. Error: {e}")
-                st.text("Raw response:")
-                st.text(response.text)
-                return None
-            
-        return evaluation_results
-    except Exception as e:
-        st.error(f"Error evaluating speech: {str(e)}")
-        return None
+def show_progress(stage, message):
+    step = STAGES.index(stage) + 1 if stage in STAGES else 0
+    st.progress(step / (len(STAGES) + 1), text=message)
+
+# An evaluation this process doesn't know, started before a restart or on another server:
+# follow the state its worker saves, or report it lost once that stops changing
+def follow_saved_evaluation():
+    saved = get_session_store().load(st.session_state.session_token)
+    if saved.get("evaluation_results") or saved.get("evaluation_error"):
+        st.session_state.evaluation_job = None
+        st.session_state.evaluation_results = saved.get("evaluation_results")
+        st.session_state.evaluated = bool(saved.get("evaluation_results"))
+        st.session_state.evaluation_error = saved.get("evaluation_error")
+        st.rerun()
+    stage, message, updated = saved.get("evaluation_progress") or (None, None, 0)
+    if saved.get("evaluation_job") == st.session_state.evaluation_job and time.time() - updated < EVALUATION_STALE_SECONDS:
+        show_progress(stage, message)
+        return
+    st.session_state.evaluation_job = None
+    st.session_state.evaluation_error = ("The evaluation was interrupted. Please try again.", None)
+    save_session(evaluation_job=None, evaluation_progress=None, evaluation_error=st.session_state.evaluation_error)
+    st.rerun()
+
+# Progress of the running evaluation, refreshed on its own without rerunning the whole page.
+# Once the job finishes the full page reruns to show the results or the error.
+@st.fragment(run_every=EVALUATION_POLL_SECONDS)
+def show_evaluation_progress():
+    job = get_job_queue().get(st.session_state.evaluation_job)
+    if job is None:
+        follow_saved_evaluation()
+        return
+    if not job.done:
+        show_progress(job.stage, job.message)
+        return
+    
+    st.session_state.evaluation_job = None
+    if job.status == "done":
+        st.session_state.evaluation_results = job.result
+        st.session_state.evaluated = True
+    else:
+        st.session_state.evaluation_error = (job.error, job.details)
+    st.rerun()
         
 intro_markdown = """
 # 🎙️ English Speech Pathologist with Dustin
@@ -661,12 +517,11 @@ def main():
             if st.button("Submit API Key"):
                 if api_key:
                     try:
-                        # Test the API key
-                        genai.configure(api_key=api_key)
-                        model = genai.GenerativeModel("gemini-2.0-flash")
-                        model.generate_content("Hello")
+                        # Test the API key with a metadata lookup instead of a generation
+                        validate_api_key(api_key, get_api_key_cache())
                         st.session_state.api_key = api_key
                         st.session_state.api_key_entered = True
+                        st.session_state.learner = learner_id(api_key)
                         st.success("API Key validated successfully!")
                         st.rerun()
                     except Exception as e:
@@ -679,6 +534,7 @@ def main():
                 if password == CORRECT_PASSWORD1 or password == CORRECT_PASSWORD2:
                     st.session_state.api_key = DEFAULT_API_KEY
                     st.session_state.api_key_entered = True
+                    st.session_state.learner = learner_id(password)
                     st.success("Password accepted!")
                     st.rerun()
                 else:
@@ -689,6 +545,9 @@ def main():
     
     # Setup Gemini model with the API key
     model = setup_gemini(st.session_state.api_key)
+    # Bring back content and results from before a refresh, reconnect or restart
+    restore_session()
+    show_progress_history()
     
     # App container
     main_container = st.container()
@@ -703,33 +562,30 @@ def main():
                 
                 with col1:
                     # Duration selector
-                    duration = st.slider("Speaking Duration (minutes)", 1, 10, 2)
+                    duration = st.slider("Speaking Duration (minutes)", MIN_DURATION, MAX_DURATION, 2)
                     
                     # Topic selector
-                    topic_options = ["Daily Reflection", "A Recent Movie or TV Show", "My Typical Weekend",  "Grocery Shopping Habits", "A IELTS Part 2", "The Last Time I Traveled",
-                                     "A Recent Conversation with a Friend", "Foods I Dislike and Why", "My Favorite Book or Movie", "A Memorable Vacation", "A Recent News Event",
-                                     "My Hometown", "My Favorite Hobby", "A Memorable Birthday", "A Time I Overcame a Challenge",  "A Memorable Meal",
-                                     "My Job or Studies", "A Skill That's Important in My Field"]                    
-                    topic = st.selectbox("Select a Topic", topic_options)
+                    topic = st.selectbox("Select a Topic", TOPIC_OPTIONS)
                 
                 with col2:
                     # Content type selector
                     content_type = st.radio("Content Type", ["Prompt Questions"])
                     
                     # Difficulty level
-                    difficulty = st.select_slider("Difficulty Level", ["Beginner", "Intermediate", "Advanced"])
+                    difficulty = st.select_slider("Difficulty Level", DIFFICULTY_LEVELS)
                 
                 # Submit button
                 submit_button = st.form_submit_button("Generate Content")
                 
                 if submit_button:
                     with st.spinner("Generating content..."):
-                        content = generate_content(model, topic, duration, content_type, difficulty)
+                        content = generate_content(model, topic, duration, content_type, difficulty, stream=True)
                         if content:
                             st.session_state.content = content
                             st.session_state.topic = topic
                             st.session_state.duration = duration
                             st.session_state.difficulty = difficulty
+                            save_session(content=content, topic=topic, duration=duration, difficulty=difficulty)
             
             # If content has been generated, display it and recording options
             if st.session_state.content:
@@ -782,26 +638,52 @@ def main():
                     if uploaded_file is not None:
                         # Save the uploaded file temporarily
                         st.session_state.audio_file = uploaded_file
+                        if uploaded_file.file_id != st.session_state.get("audio_file_id"):
+                            st.session_state.audio_file_id = uploaded_file.file_id
+                            fingerprint = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+                            # An error about a different recording no longer applies
+                            if fingerprint != st.session_state.get("audio_fingerprint"):
+                                st.session_state.evaluation_error = None
+                            st.session_state.audio_name = uploaded_file.name
+                            st.session_state.audio_fingerprint = fingerprint
+                            save_session(audio_name=uploaded_file.name, audio_fingerprint=fingerprint,
+                                         evaluation_error=st.session_state.evaluation_error)
                         st.success("Audio file uploaded successfully!")
                         # Display the audio player
                         st.audio(uploaded_file, format=f"audio/{uploaded_file.name.split('.')[-1]}")
                 
+                # The file itself isn't saved, so after a refresh the learner uploads it again
+                if not st.session_state.audio_file and st.session_state.get("audio_name"):
+                    st.info(f"Upload {st.session_state.audio_name} again to evaluate it.")
+
                 # If we have an audio file, show the evaluate button
                 if st.session_state.audio_file:
-                    if st.button("Evaluate My Speech"):
-                        # Evaluate the speech with the updated function
-                        evaluation_results = evaluate_speech(
+                    single_pass = st.checkbox(
+                        "Fast evaluation (transcribe and score in one request)",
+                        value=SINGLE_PASS_EVALUATION
+                    )
+                    evaluating = st.session_state.evaluation_job is not None
+                    if st.button("Evaluate My Speech", disabled=evaluating):
+                        # Evaluate the speech on a background worker
+                        submit_evaluation(
                             model, 
                             st.session_state.audio_file, 
                             st.session_state.topic, 
                             st.session_state.duration,
-                            st.session_state.difficulty
+                            st.session_state.difficulty,
+                            single_pass=single_pass
                         )
-                        
-                        if evaluation_results:
-                            st.session_state.evaluation_results = evaluation_results
-                            st.session_state.evaluated = True
-                            st.rerun()
+                        st.rerun()
+                
+                # Outside the upload check, so an evaluation still shows after a refresh
+                if st.session_state.evaluation_job is not None:
+                    show_evaluation_progress()
+                elif st.session_state.evaluation_error:
+                    error, details = st.session_state.evaluation_error
+                    st.error(error)
+                    if details:
+                        st.text("Raw response:")
+                        st.text(details)
                         
         # If we've evaluated, show the results
         else:
@@ -821,12 +703,18 @@ def main():
             # Calculate overall score
             overall_score = round(sum(scores) / len(scores), 1)
             
+            # Measured fluency metrics (absent for formats that could not be decoded)
+            features = st.session_state.evaluation_results.get("acoustic_features")
+            
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                # Display radar chart
-                fig = create_radar_chart(categories, scores)
-                st.pyplot(fig)
+                # Display radar chart, memoized by its scores
+                with metrics.STAGE_SECONDS.labels(stage=f"radar_chart_{RADAR_CHART_RENDERER}").time():
+                    if RADAR_CHART_RENDERER == "matplotlib":
+                        st.image(radar_chart_png(tuple(categories), tuple(scores)))
+                    else:
+                        st.markdown(radar_chart_svg(tuple(categories), tuple(scores)), unsafe_allow_html=True)
             
             with col2:
                 st.markdown(f"<div style='text-align: center; padding: 10px;'>", unsafe_allow_html=True)
@@ -837,6 +725,22 @@ def main():
                 # Category scores
                 for category, score in zip(categories, scores):
                     st.markdown(f"**{category}**: {score}/10")
+                
+                if features:
+                    st.markdown("**Measured fluency**")
+                    st.markdown(f"Speech rate: {features['speech_rate']:.0f} syll/min")
+                    st.markdown(f"Articulation rate: {features['articulation_rate']:.0f} syll/min")
+                    st.markdown(f"Mean length of run: {features['mean_length_of_run']:.1f} syll")
+                    st.markdown(f"Pauses: {features['pause_count']} ({features['pauses_per_minute']:.1f}/min)")
+            
+            if features:
+                with st.expander("Pitch and loudness over time"):
+                    st.caption("Pitch (Hz) while voiced")
+                    st.line_chart([value if value is not None else float("nan") for value in features["pitch_contour"]])
+                    st.caption("Loudness (dB)")
+                    st.line_chart(features["energy_contour"])
+                    st.caption("Pauses by length")
+                    st.bar_chart(features["pause_histogram"])
             
             # Add error highlight legend
             st.markdown("<div class='error-legend'>", unsafe_allow_html=True)
@@ -895,13 +799,70 @@ def main():
                 
             # Start over button
             if st.button("Start Over"):
-                for key in ['recording', 'audio_file', 'evaluated', 'evaluation_results', 'content']:
+                for key in ['recording', 'audio_file', 'evaluated', 'evaluation_results', 'content', 'evaluation_error',
+                            'audio_file_id', 'audio_name', 'audio_fingerprint']:
                     if key in st.session_state:
                         st.session_state[key] = False if key == 'recording' or key == 'evaluated' else None
+                # A fresh token, so nothing saved for the finished round comes back
+                get_session_store().clear(st.session_state.session_token)
+                start_new_session()
                 st.rerun()
 
+# Score trends of this learner (everyone signed in with the same key or password), read from
+# per-day sums and precomputed moving averages
+def show_progress_history():
+    if not st.session_state.learner:
+        return
+    history = get_progress_history()
+    with metrics.STAGE_SECONDS.labels(stage="progress_history").time():
+        summary = history.summary(st.session_state.learner)
+        if not summary["evaluations"]:
+            return
+        trend = history.daily_trend(st.session_state.learner)
+        recent = history.recent(st.session_state.learner)
+
+    count = summary["evaluations"]
+    with st.expander(f"📈 Your progress ({count} evaluation{'s' if count != 1 else ''} since {summary['first_day']})"):
+        labels = {key: key.capitalize() for key in ["overall", "pronunciation", "vocabulary", "grammar", "fluency", "coherence"]}
+        latest = recent[-1]
+        columns = st.columns(len(labels))
+        for column, (key, label) in zip(columns, labels.items()):
+            # Latest moving average, against the average over the whole history
+            column.metric(label, f"{latest[f'average_{key}']:.1f}",
+                          f"{latest[f'average_{key}'] - summary[key]:+.1f} vs. all-time")
+
+        if len(trend) > 1:
+            st.caption("Average score per day")
+            st.line_chart({"day": [day["day"] for day in trend],
+                           **{label: [day[key] for day in trend] for key, label in labels.items()}}, x="day")
+        st.caption(f"Moving average over {MOVING_AVERAGE_WINDOW} evaluations, last {len(recent)} evaluations")
+        st.line_chart({label: [row[f"average_{key}"] for row in recent] for key, label in labels.items()})
+
+        if summary["speech_rate"] is not None:
+            st.caption("Measured fluency, all-time average")
+            st.markdown(" · ".join([
+                f"Speech rate {summary['speech_rate']:.0f} syll/min",
+                f"Articulation rate {summary['articulation_rate']:.0f} syll/min",
+                f"Mean length of run {summary['mean_length_of_run']:.1f} syll",
+                f"{summary['pauses_per_minute']:.1f} pauses/min",
+            ]))
+
+# Process-wide stage timings and counters, for finding where slow evaluations spend their time
+def show_debug_panel():
+    with st.expander("Debug: performance metrics"):
+        for title, histogram in [("Pipeline stages", metrics.STAGE_SECONDS),
+                                 ("Model calls", metrics.GEMINI_REQUEST_SECONDS),
+                                 ("Rate limiter waits", metrics.GEMINI_QUEUE_SECONDS)]:
+            rows = metrics.histogram_summary(histogram)
+            if rows:
+                st.markdown(f"**{title}**")
+                st.table(rows)
+        st.code(metrics.render(), language="text")
+
 if __name__ == "__main__":
     main()
+    if SHOW_DEBUG_PANEL:
+        show_debug_panel()
     
     
         # Mark errors in the transcription using HTML:
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from prometheus_client import REGISTRY
+
+import call_policy
+from call_policy import HEDGE_MIN_SAMPLES, call_with_policy
+
+
+def hedges(stage):
+    return REGISTRY.get_sample_value("gemini_hedged_requests_total", {"stage": stage}) or 0
+
+
+def train(stage, seconds):
+    for _ in range(HEDGE_MIN_SAMPLES):
+        call_policy.latencies.record(stage, seconds)
+
+
+def test_slow_attempt_is_hedged_and_the_first_answer_wins():
+    train("test-slow", 0.05)
+    calls = []
+
+    def attempt(timeout):
+        calls.append(timeout)
+        # The first copy stalls; the hedge answers quickly
+        time.sleep(2 if len(calls) == 1 else 0.01)
+        return len(calls)
+
+    started = time.monotonic()
+    assert call_with_policy(attempt, "test-slow", hedge=True) == 2
+    assert time.monotonic() - started < 1
+    assert hedges("test-slow") == 1
+
+
+def test_many_concurrent_calls_are_not_hedged():
+    # Far more calls than a fixed worker pool would run at once, each well within the p95
+    train("test-busy", 0.3)
+    results = []
+
+    def call():
+        results.append(call_with_policy(lambda timeout: time.sleep(0.1) or "ok", "test-busy", hedge=True))
+
+    threads = [threading.Thread(target=call) for _ in range(64)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == ["ok"] * 64
+    assert hedges("test-busy") == 0
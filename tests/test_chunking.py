@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from audio_processing import split_on_silence
+from speech_evaluation import stitch_transcripts
+
+RATE = 16000
+
+
+def tone(seconds):
+    t = np.arange(int(RATE * seconds)) / RATE
+    return (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return (np.random.default_rng(0).standard_normal(int(RATE * seconds)) * 0.001).astype(np.float32)
+
+
+def assert_covers(ranges, length, overlap):
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == length
+    assert not ranges[0][2]
+    for (_, previous_end, _), (start, _, overlapped) in zip(ranges, ranges[1:]):
+        # A chunk after a hard cut starts inside the previous one; after a pause cut it starts where it ended
+        assert previous_end - start == (int(overlap * RATE) if overlapped else 0)
+
+
+def test_continuous_speech_is_cut_hard_with_overlap():
+    samples = tone(100)
+    ranges = split_on_silence(samples, RATE, chunk_seconds=30, overlap_seconds=2)
+    assert [overlapped for _, _, overlapped in ranges] == [False, True, True, True]
+    assert [start for start, _, _ in ranges] == [0, 30 * RATE, 60 * RATE, 90 * RATE]
+    assert_covers(ranges, len(samples), overlap=2)
+
+
+def test_cuts_fall_in_pauses_near_the_chunk_end():
+    # Speech with a one second pause 26 s into every 30 s
+    samples = np.concatenate([tone(26), silence(1), tone(29), silence(1), tone(30)])
+    ranges = split_on_silence(samples, RATE, chunk_seconds=30, overlap_seconds=2)
+    assert len(ranges) == 3
+    assert not any(overlapped for _, _, overlapped in ranges)
+    first_cut, second_cut = ranges[0][1], ranges[1][1]
+    assert 26 * RATE < first_cut < 27 * RATE
+    assert 56 * RATE < second_cut < 57 * RATE
+    assert_covers(ranges, len(samples), overlap=2)
+
+
+def test_short_remainder_stays_with_the_last_chunk():
+    samples = tone(36)
+    assert split_on_silence(samples, RATE, chunk_seconds=30, overlap_seconds=2) == [(0, len(samples), False)]
+
+
+def test_stitch_drops_words_repeated_across_an_overlap():
+    parts = ["we went to the market and bought some", "and bought some fresh bread for dinner"]
+    assert stitch_transcripts(parts, [False, True]) == "we went to the market and bought some fresh bread for dinner"
+
+
+def test_stitch_allows_for_a_word_cut_off_at_the_seam():
+    # The first chunk ends mid-word ("fre"), and the second repeats it in full
+    parts = ["we bought some fresh bread and some fre", "bread and some fresh fruit too"]
+    assert stitch_transcripts(parts, [False, True]) == "we bought some fresh bread and some fresh fruit too"
+
+
+def test_stitch_ignores_case_and_punctuation_in_the_seam():
+    # The repeated words are kept as the earlier chunk transcribed them
+    parts = ["It was late. We walked home", "we walked home, slowly."]
+    assert stitch_transcripts(parts, [False, True]) == "It was late. We walked home slowly."
+
+
+@pytest.mark.parametrize("overlapped", [False, True])
+def test_stitch_keeps_words_without_a_repeated_run(overlapped):
+    parts = ["the first part ends here", "and the second begins"]
+    assert stitch_transcripts(parts, [False, overlapped]) == "the first part ends here and the second begins"
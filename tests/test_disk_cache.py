@@ -0,0 +1,64 @@
+import pytest
+
+import disk_cache
+from disk_cache import DiskCache
+
+
+# A clock the test moves by hand, so expiry and access order don't depend on timing
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+
+    def time():
+        now[0] += 0.001
+        return now[0]
+
+    monkeypatch.setattr(disk_cache.time, "time", time)
+    return now
+
+
+def test_get_returns_stored_value(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("key") is None
+    cache.put("key", {"scores": [1, 2]})
+    assert cache.get("key") == {"scores": [1, 2]}
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.put("old", "a")
+    clock[0] += 30
+    cache.put("new", "b")
+    clock[0] += 40
+    assert cache.get("old") is None
+    assert cache.get("new") == "b"
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path, clock):
+    value = "x" * 100
+    entry_size = len(f'"{value}"')
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_bytes=3 * entry_size)
+    for key in ["a", "b", "c"]:
+        cache.put(key, value)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == value
+    cache.put("d", value)
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ["a", "c", "d"]] == [value] * 3
+
+
+def test_variants_miss_until_filled_then_rotate(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("topic", "first", variants=2)
+    assert cache.get("topic", variants=2) is None
+    cache.put("topic", "second", variants=2)
+    served = [cache.get("topic", variants=2) for _ in range(4)]
+    assert served == ["first", "second", "first", "second"]
+
+
+def test_full_variants_replace_the_oldest(tmp_path, clock):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"))
+    for value in ["first", "second", "third"]:
+        cache.put("topic", value, variants=2)
+    served = {cache.get("topic", variants=2) for _ in range(2)}
+    assert served == {"second", "third"}
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from speech_evaluation import (
+    SCORE_KEYS, evaluation_problems, extract_json_object, merge_evaluation, normalize_evaluation,
+    parse_evaluation_response
+)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1, "b": [1, 2]}\n```', {"a": 1, "b": [1, 2]}),
+    ('Here is the evaluation:\n{"a": 1}\nLet me know if you need more.', {"a": 1}),
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1, // the score\n /* note */ "b": 2}', {"a": 1, "b": 2}),
+    ('{"a": True, "b": None}', {"a": True, "b": None}),
+])
+def test_extract_repairs_common_defects(text, expected):
+    assert extract_json_object(text) == expected
+
+
+def test_extract_copies_braces_and_quotes_inside_strings():
+    text = 'Result: {"text": "a {brace} and \\"quote\\", // not a comment", "b": 1} trailing {junk}'
+    assert extract_json_object(text) == {"text": 'a {brace} and "quote", // not a comment', "b": 1}
+
+
+def test_extract_closes_a_truncated_answer():
+    assert extract_json_object('{"a": 1, "b": {"c": [1, 2') == {"a": 1, "b": {"c": [1, 2]}}
+
+
+def test_extract_drops_a_string_cut_off_midway():
+    assert extract_json_object('{"a": 1, "b": "half a sent') == {"a": 1}
+
+
+@pytest.mark.parametrize("text", ["No JSON here", "[1, 2, 3]", '{"a": "never closed'])
+def test_extract_raises_when_nothing_parseable_is_left(text):
+    with pytest.raises(json.JSONDecodeError):
+        extract_json_object(text)
+
+
+@pytest.mark.parametrize("text", ["7", '"a string"', "[1, 2]"])
+def test_parse_rejects_answers_that_are_not_objects(text):
+    with pytest.raises(json.JSONDecodeError):
+        parse_evaluation_response(text)
+
+
+def test_normalize_coerces_scores_and_keys():
+    evaluation = normalize_evaluation({
+        "scores": {"Pronunciation": "7/10", "vocabulary": "6.5", "Grammar Score": 8.0, "fluency": 7, "coherence": "n/a"},
+        "detailed_feedback": {"PRONUNCIATION": "Clear."},
+        "strengths": "Good pace",
+        "improvement_recommendations": ["Slow down"],
+        "transcription_with_errors": "I &lt;b&gt;goed&lt;/b&gt; home",
+    })
+    assert evaluation["scores"] == {"pronunciation": 7, "vocabulary": 6.5, "grammar": 8, "fluency": 7, "coherence": "n/a"}
+    assert isinstance(evaluation["scores"]["pronunciation"], int)
+    assert evaluation["detailed_feedback"] == {"pronunciation": "Clear."}
+    assert evaluation["strengths"] == ["Good pace"]
+    assert evaluation["improvement_recommendations"] == ["Slow down"]
+    assert evaluation["transcription_with_errors"] == "I <b>goed</b> home"
+    # A score that can't be read as a number is left for the validation to report
+    assert evaluation_problems(evaluation)[0] == "scores"
+
+
+def test_merge_fills_only_the_requested_fields():
+    evaluation = {"scores": {key: 5 for key in SCORE_KEYS}, "strengths": ["kept"]}
+    repair = {"detailed_feedback": {key: "ok" for key in SCORE_KEYS}, "strengths": ["replaced"], "scores": {}}
+    merged = merge_evaluation(evaluation, repair, ["detailed_feedback", "improvement_recommendations"])
+    assert merged["detailed_feedback"] == {key: "ok" for key in SCORE_KEYS}
+    assert merged["strengths"] == ["kept"]
+    assert merged["scores"] == {key: 5 for key in SCORE_KEYS}
+    assert "improvement_recommendations" not in merged
@@ -0,0 +1,79 @@
+import io
+import json
+import wave
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from call_policy import CallDeadlineExceeded
+from evaluation_pipeline import EvaluationError, evaluate_recording
+from speech_evaluation import SCORE_KEYS
+
+EVALUATION = {
+    "scores": {key: 7 for key in SCORE_KEYS},
+    "transcription_with_errors": "I like my hometown.",
+    "detailed_feedback": {key: "Good." for key in SCORE_KEYS},
+    "strengths": ["Clear"],
+    "improvement_recommendations": ["Slow down"],
+}
+
+
+def recording():
+    rate = 16000
+    t = np.arange(rate * 2) / rate
+    samples = (0.3 * np.sin(2 * np.pi * 200 * t) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    buffer.seek(0)
+    return buffer
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+# Answers each request with the next reply: a string, or an exception to raise
+class ScriptedModel:
+    model_name = "scripted"
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.requests = 0
+
+    def for_stage(self, stage):
+        return self
+
+    def generate_content(self, contents, **kwargs):
+        self.requests += 1
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return Response(reply)
+
+
+def fallbacks():
+    return REGISTRY.get_sample_value("speech_single_pass_fallbacks_total") or 0
+
+
+def test_invalid_single_pass_answer_falls_back_to_two_steps():
+    before = fallbacks()
+    model = ScriptedModel("not json", "I like my hometown.", json.dumps(EVALUATION))
+    result = evaluate_recording(model, recording(), "My Hometown", 2, "Beginner", single_pass=True)
+    assert result["scores"] == EVALUATION["scores"]
+    assert model.requests == 3
+    assert fallbacks() == before + 1
+
+
+def test_single_pass_call_errors_are_not_retried_in_two_steps():
+    before = fallbacks()
+    model = ScriptedModel(CallDeadlineExceeded("Model call did not finish within 180 s"))
+    with pytest.raises(EvaluationError, match="180 s"):
+        evaluate_recording(model, recording(), "My Hometown", 2, "Beginner", single_pass=True)
+    assert model.requests == 1
+    assert fallbacks() == before
@@ -0,0 +1,94 @@
+import gc
+import threading
+from collections import OrderedDict
+
+import pytest
+
+import gemini_client
+from gemini_client import wrap_model
+from mock_gemini import MockModel
+from rate_limit import RateLimitTimeout
+
+
+def mock_model(api_key):
+    mock = MockModel(latency_scale=0.05, error_rate=0, seed=0)
+    return mock, wrap_model(mock, api_key).for_stage("content")
+
+
+def read(stream):
+    return "".join(chunk.text for chunk in stream)
+
+
+def test_identical_streams_share_one_request():
+    mock, model = mock_model("test-identical-streams")
+    texts = []
+
+    def request():
+        texts.append(read(model.generate_content("Create practice questions", stream=True)))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(mock.calls) == 1
+    assert len(texts) == 8 and len(set(texts)) == 1
+
+
+def test_unread_stream_does_not_hold_up_later_requests():
+    _, model = mock_model("test-unread-stream")
+    stream = model.generate_content("Create practice questions", stream=True)
+    del stream
+    gc.collect()
+    closed = iter(model.generate_content("Create practice questions", stream=True))
+    next(closed)
+    closed.close()
+    assert read(model.generate_content("Create practice questions", stream=True))
+
+
+def test_uncoalesced_requests_are_each_sent():
+    mock, model = mock_model("test-uncoalesced")
+    threads = [
+        threading.Thread(target=model.generate_content, args=("Create practice questions",), kwargs={"coalesce": False})
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(mock.calls) == 3
+
+
+def test_idle_throttles_are_evicted_least_recently_used_first(monkeypatch):
+    monkeypatch.setattr(gemini_client, "_throttles", OrderedDict())
+    monkeypatch.setattr(gemini_client, "MAX_POOLED_CLIENTS", 2)
+    first = gemini_client._throttle_for("key-1")
+    gemini_client._throttle_for("key-2")
+    # A throttle with a request in flight is kept even when least recently used
+    future, _ = first.inflight.claim("request")
+    gemini_client._throttle_for("key-3")
+    assert gemini_client._throttle_for("key-1") is first
+    assert len(gemini_client._throttles) == 2
+    first.inflight.settle("request", future, result=None)
+    # Once idle it is evicted when it is the least recently used
+    gemini_client._throttle_for("key-4")
+    gemini_client._throttle_for("key-5")
+    assert list(gemini_client._throttles) == [gemini_client._key_digest(key) for key in ["key-4", "key-5"]]
+
+
+def test_rate_limiter_wait_counts_against_the_deadline(monkeypatch):
+    monkeypatch.setattr(gemini_client, "REQUESTS_PER_MINUTE", 120)
+    monkeypatch.setattr(gemini_client, "REQUEST_BURST", 1)
+    mock, model = mock_model("test-queue-deadline")
+    timeouts = []
+    send = mock.generate_content
+    monkeypatch.setattr(mock, "generate_content", lambda *args, **kwargs: (
+        timeouts.append(kwargs["request_options"]["timeout"]), send(*args, **kwargs))[1])
+    model._send("first", {}, timeout=5)
+    # The next token is half a second away: the request gets what is left of its deadline
+    model._send("second", {}, timeout=2)
+    assert timeouts[1] < 1.6
+    # A deadline sooner than the next token gives up in the queue
+    with pytest.raises(RateLimitTimeout):
+        model._send("third", {}, timeout=0.2)
+    assert len(timeouts) == 2
@@ -0,0 +1,56 @@
+import threading
+import time
+
+from job_queue import Job, JobQueue
+
+
+def wait_for(queue, job_id):
+    deadline = time.monotonic() + 5
+    while not queue.get(job_id).done:
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+    return queue.get(job_id)
+
+
+def test_job_reports_progress_and_result():
+    queue = JobQueue(max_workers=1)
+    release = threading.Event()
+
+    def work(value, progress):
+        progress("working", "Halfway there")
+        release.wait(5)
+        return value * 2
+
+    job_id = queue.submit(work, 21)
+    deadline = time.monotonic() + 5
+    while queue.get(job_id).stage != "working":
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+    assert queue.get(job_id).message == "Halfway there"
+    release.set()
+    job = wait_for(queue, job_id)
+    assert (job.status, job.result) == ("done", 42)
+    assert job.finished is not None
+
+
+def test_failed_job_keeps_the_error():
+    queue = JobQueue(max_workers=1)
+
+    def work(progress):
+        raise ValueError("no audio")
+
+    job = wait_for(queue, queue.submit(work))
+    assert (job.status, job.error) == ("failed", "no audio")
+
+
+def test_submit_prunes_only_jobs_finished_long_ago():
+    queue = JobQueue(max_workers=1, retention_seconds=60)
+    expired, finishing = Job("expired"), Job("finishing")
+    expired.status, expired.finished = "done", time.time() - 120
+    # Caught between its status and finish time being written by the worker
+    finishing.status = "done"
+    queue._jobs.update({"expired": expired, "finishing": finishing})
+    job_id = queue.submit(lambda progress: None)
+    assert queue.get("expired") is None
+    assert queue.get("finishing") is finishing
+    wait_for(queue, job_id)
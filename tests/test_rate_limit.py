@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+
+from rate_limit import FairRateLimiter, InflightRequests, RateLimitTimeout
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def queued(limiter):
+    with limiter._condition:
+        return sum(len(tickets) for tickets in limiter._waiting.values())
+
+
+def test_sessions_are_served_round_robin():
+    limiter = FairRateLimiter(rate_per_second=10, burst=1)
+    limiter.acquire("warmup")
+    served = []
+    lock = threading.Lock()
+
+    def request(session, name):
+        limiter.acquire(session)
+        with lock:
+            served.append(name)
+
+    threads = []
+    # Session "a" queues three requests before "b" and "c" queue one each
+    for session, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("c", "c1")]:
+        thread = threading.Thread(target=request, args=(session, name))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: queued(limiter) == len(threads))
+    for thread in threads:
+        thread.join(5)
+    assert served == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_burst_is_served_without_waiting():
+    limiter = FairRateLimiter(rate_per_second=0.1, burst=3)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.acquire("a", timeout=1)
+    assert time.monotonic() - started < 0.5
+
+
+def test_timeout_raises_and_gives_up_the_turn():
+    limiter = FairRateLimiter(rate_per_second=0.5, burst=1)
+    limiter.acquire("a")
+    started = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("a", timeout=0.1)
+    assert time.monotonic() - started < 1
+    # The abandoned ticket no longer holds up other sessions
+    assert queued(limiter) == 0
+    assert isinstance(RateLimitTimeout(), TimeoutError)
+
+
+def test_identical_requests_share_one_result():
+    inflight = InflightRequests()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(inflight.run("key", fn))) for _ in range(4)]
+    threads[0].start()
+    wait_until(lambda: calls)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert len(results) == 4 and all(result is results[0] for result in results)
+    # Once finished, the same key runs again
+    release.set()
+    assert inflight.run("key", fn) is not results[0]
+    assert len(calls) == 2
+
+
+def test_identical_requests_share_one_exception():
+    inflight = InflightRequests()
+    release = threading.Event()
+    started = threading.Event()
+    error = ValueError("model unavailable")
+
+    def fn():
+        started.set()
+        release.wait(5)
+        raise error
+
+    raised = []
+
+    def call():
+        try:
+            inflight.run("key", fn)
+        except ValueError as e:
+            raised.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=call) for _ in range(2)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.2)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert raised == [error] * 3